@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# last forwarded telegram message id per topic, plus a channel-wide watermark
+class Checkpoints:
+    def __init__(self, store, origem_id, pending_ids=None):
+        self.store = store
+        self.key = f"checkpoints:{origem_id}"
+        self.watermark_key = f"watermark:{origem_id}"
+
+        # checkpoints: {topic_id (0 for messages outside topics): last_message_id}
+        self._last_ids = {}
+
+        # every message up to the watermark was handled, whatever its topic; a quiet topic can't hold it back
+        self.watermark = 0
+
+        # first message id of each event still being delivered (given the id just delivered), the watermark stays below them
+        self.pending_ids = pending_ids or (lambda done: ())
+
+        # live deliveries only move the watermark once the backfill has covered the gap before them
+        self.synced = False
+
+    async def load(self):
+        data = await self.store.get_state(self.key, {})
+        self._last_ids = {int(k): v for k, v in data.items()}
+        self.watermark = await self.store.get_state(self.watermark_key, 0)
+        logger.info(f"Checkpoints carregados: {len(self._last_ids)} tópicos, marca d'água {self.watermark}")
+
+    def get(self, topic_id):
+        return self._last_ids.get(topic_id or 0, 0)
+
+    def snapshot(self):
+        return dict(self._last_ids)
+
+    def _update_watermark(self, done=None, upto=0):
+        if not self.synced:
+            return
+
+        watermark = max(upto, *self._last_ids.values(), 0)
+        pending = list(self.pending_ids(done))
+        if pending:
+            watermark = min(watermark, min(pending) - 1)
+
+        if watermark > self.watermark:
+            self.watermark = watermark
+            self.store.put_state(self.watermark_key, watermark)
+
+    def advance(self, topic_id, message_id):
+        topic_id = topic_id or 0
+        if message_id > self._last_ids.get(topic_id, 0):
+            self._last_ids[topic_id] = message_id
+
+            # the store batches these, so a burst of messages costs one write
+            self.store.put_state(self.key, {str(k): v for k, v in self._last_ids.items()})
+
+        self._update_watermark(done=message_id)
+
+    def sync(self, upto):
+        """
+        Marca que tudo até a mensagem upto foi tratado (fim do backfill); a partir daí as entregas ao vivo avançam a marca d'água
+        """
+        self.synced = True
+        self._update_watermark(upto=upto)
+
+
+async def run_backfill(client, channel_entity, checkpoints, message_index, get_topic_id,
+                       forward_message, forward_album, log_every=500, concurrency=20,
+                       send_rate=0, max_gap=20000):
+    """
+    Reenvia, em ordem, as mensagens postadas enquanto a ponte estava parada.
+    Retoma de onde parou graças à marca d'água do canal e aos checkpoints por tópico.
+    """
+    last_ids = checkpoints.snapshot()
+    if not last_ids:
+        logger.info("Nenhum checkpoint encontrado, backfill ignorado")
+        checkpoints.sync(0)
+        return 0
+
+    # everything up to the watermark was handled; above it only topic checkpoints tell what was forwarded
+    start_id = max(checkpoints.watermark, min(last_ids.values()), max(last_ids.values()) - max_gap)
+
+    logger.info(f"Backfill iniciado a partir da mensagem {start_id}")
+    started_at = time.monotonic()
+
+    in_flight = set()
+    semaphore = asyncio.Semaphore(concurrency)
+    forwarded = 0
+    album = []
+
+    def pending(message):
+        topic_id = get_topic_id(message)
+        if message.id <= last_ids.get(topic_id or 0, start_id):
+            return False
+
+        # forwarded live while the backfill was running
+        return message_index.get(topic_id, message.id) is None
+
+    async def submit(forward, arg):
+        nonlocal forwarded
+
+        # throttle discord sends from the backfill
+        if send_rate:
+            await asyncio.sleep(1 / send_rate)
+
+        await semaphore.acquire()
+        future = await forward(arg)
+        if future is None:
+            semaphore.release()
+            return
+
+        forwarded += 1
+        in_flight.add(future)
+
+        def done(f):
+            in_flight.discard(f)
+            semaphore.release()
+        future.add_done_callback(done)
+
+    async def flush_album():
+        if album:
+            await submit(forward_album, list(album))
+            album.clear()
+
+    async def process(message):
+        if getattr(message, 'action', None) or not pending(message):
+            return
+
+        # consecutive parts of the same album go out together
+        if album and album[0].grouped_id != message.grouped_id:
+            await flush_album()
+        if message.grouped_id:
+            album.append(message)
+        else:
+            await flush_album()
+            await submit(forward_message, message)
+
+    # telethon fetches the history 100 messages per request (telegram's maximum), messages are handled as they come
+    scanned = 0
+    last_id = start_id
+    async for message in client.iter_messages(channel_entity, min_id=start_id, reverse=True, wait_time=0):
+        await process(message)
+        last_id = message.id
+        scanned += 1
+        if scanned % log_every == 0:
+            logger.info(f"Backfill: {forwarded} mensagens enfileiradas, até a mensagem {message.id}")
+    await flush_album()
+
+    # wait for the last deliveries so the checkpoints are written
+    if in_flight:
+        await asyncio.wait(list(in_flight))
+
+    # whatever failed for good is acknowledged by the outbox, transient failures still hold the watermark back
+    checkpoints.sync(last_id)
+
+    elapsed = time.monotonic() - started_at
+    logger.info(f"Backfill concluído: {forwarded} mensagens em {elapsed:.1f}s")
+    return forwarded
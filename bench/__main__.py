@@ -0,0 +1,340 @@
+"""
+Benchmark offline da ponte: reproduz um fluxo de eventos (sintético ou gravado) pelos handlers
+reais, com clientes Telegram e Discord simulados.
+
+    python -m bench --messages 2000 --rate 0 --send-latency 0.05 --rate-limit-ratio 0.01
+"""
+from telethon.tl import types
+from telethon import utils
+from types import SimpleNamespace
+import datetime
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+import json
+import os
+
+import config
+from routes import Route
+from bridge import RouteBridge
+from handlers import TelegramHandlers
+from media import MediaFetcher
+from channel_resolver import ChannelResolver
+from storage import SQLiteStore
+from metrics import metrics
+from main import register_metrics
+from webhooks import WebhookRegistry
+from media_cache import MediaCache
+from filters import MessageFilter
+from bench import scenario
+from bench.fakes import (
+    FakeTelegramClient, FakeDiscordClient, FakeMessage, FakeSender, DiscordFaults, Latency
+)
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger("bench")
+
+GUILD_ID = 1
+CHANNEL_BASE = 1000
+
+
+# hands out the fake webhooks instead of discord.Webhook objects
+class FakeWebhookRegistry(WebhookRegistry):
+    def _partial(self, webhook_id, token):
+        return self.discord_client.webhooks[webhook_id]
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Benchmark offline da ponte Telegram -> Discord")
+
+    stream = parser.add_argument_group("fluxo de eventos")
+    stream.add_argument("--events", help="arquivo jsonl gravado (ignora as opções do fluxo sintético)")
+    stream.add_argument("--save-events", help="grava o fluxo usado neste arquivo jsonl")
+    stream.add_argument("--messages", type=int, default=1000)
+    stream.add_argument("--routes", type=int, default=1)
+    stream.add_argument("--topics", type=int, default=20)
+    stream.add_argument("--rate", type=float, default=0, help="eventos por segundo (0 = o mais rápido possível)")
+    stream.add_argument("--burst", type=int, default=5, help="tamanho máximo das rajadas de texto")
+    stream.add_argument("--media-ratio", type=float, default=0.1)
+    stream.add_argument("--album-ratio", type=float, default=0.05)
+    stream.add_argument("--edit-ratio", type=float, default=0.05)
+    stream.add_argument("--long-ratio", type=float, default=0.02, help="fração de textos acima de 2000 caracteres")
+    stream.add_argument("--media-size", type=int, default=512 * 1024, help="tamanho médio das mídias em bytes")
+    stream.add_argument("--large-ratio", type=float, default=0.01, help="fração de mídias acima do limite de upload")
+    stream.add_argument("--repeat-ratio", type=float, default=0.0, help="fração de mídias que repetem um arquivo já enviado")
+    stream.add_argument("--seed", type=int, default=0)
+
+    fakes = parser.add_argument_group("clientes simulados")
+    fakes.add_argument("--send-latency", type=float, default=0.05)
+    fakes.add_argument("--edit-latency", type=float, default=0.05)
+    fakes.add_argument("--webhook-latency", type=float, default=0.05, help="latência das execuções de webhook")
+    fakes.add_argument("--create-channel-latency", type=float, default=0.3)
+    fakes.add_argument("--sender-latency", type=float, default=0.01)
+    fakes.add_argument("--telegram-latency", type=float, default=0.05, help="latência das requisições de tópicos")
+    fakes.add_argument("--download-latency", type=float, default=0.05)
+    fakes.add_argument("--bandwidth", type=float, default=50 * 1024 * 1024, help="bytes/s de download")
+    fakes.add_argument("--jitter", type=float, default=0.5, help="variação relativa das latências")
+    fakes.add_argument("--rate-limit-ratio", type=float, default=0.0, help="probabilidade de 429 por chamada ao Discord")
+    fakes.add_argument("--retry-after", type=float, default=1.0)
+    fakes.add_argument("--server-error-ratio", type=float, default=0.0, help="probabilidade de 503 por chamada ao Discord")
+    fakes.add_argument("--upload-limit", type=int, default=10 * 1024 * 1024, help="acima disso o Discord responde 413")
+    fakes.add_argument("--unknown-topics", action="store_true", help="não pré-carrega os títulos (força GetForumTopicsByID)")
+
+    bridge = parser.add_argument_group("configuração da ponte")
+    bridge.add_argument("--coalesce-window", type=float, default=config.COALESCE_WINDOW)
+    bridge.add_argument("--dispatch-concurrency", type=int, default=config.DISPATCH_CONCURRENCY)
+    bridge.add_argument("--dispatch-queue-size", type=int, default=config.DISPATCH_QUEUE_SIZE)
+    bridge.add_argument("--channel-burst", type=int, default=config.DISPATCH_CHANNEL_BURST)
+    bridge.add_argument("--channel-period", type=float, default=config.DISPATCH_CHANNEL_PERIOD)
+    bridge.add_argument("--max-downloads", type=int, default=config.MEDIA_MAX_DOWNLOADS)
+    bridge.add_argument("--media-cache", type=int, default=config.MEDIA_CACHE_MAX, help="entradas do cache de mídias (0 desativa)")
+    bridge.add_argument("--filters", help="arquivo json de filtros (FILTERS_FILE)")
+    bridge.add_argument("--outbox-retry-base", type=float, default=0.2, help="espera antes da primeira nova tentativa do outbox")
+    bridge.add_argument("--webhooks", action="store_true", default=config.DISCORD_DELIVERY == 'webhook', help="envia pelos webhooks dos canais")
+
+    parser.add_argument("--drain-timeout", type=float, default=120, help="segundos máximos esperando o outbox esvaziar")
+    parser.add_argument("--json", help="grava o resultado neste arquivo json")
+    parser.add_argument("--verbose", action="store_true", help="mostra os logs da ponte")
+    return parser.parse_args()
+
+
+def latency(mean, jitter):
+    return Latency(mean, mean * jitter)
+
+
+def build_message(telegram_client, route, event, part=None, grouped_id=None):
+    data = part or event
+    return FakeMessage(
+        telegram_client,
+        CHANNEL_BASE + route,
+        data["id"],
+        text=data.get("text", ""),
+        topic_id=event.get("topic"),
+        sender=FakeSender(event["sender"], f"Usuário {event['sender']}"),
+        media_size=data.get("media_size"),
+        document=data.get("document", False),
+        grouped_id=grouped_id,
+        edit_date=datetime.datetime.now(datetime.timezone.utc) if event["type"] == "edit" else None,
+        media_id=data.get("media_id")
+    )
+
+
+async def replay(args, events):
+    # the bridge reads these when the route is built
+    config.COALESCE_WINDOW = args.coalesce_window
+    config.DISPATCH_CONCURRENCY = args.dispatch_concurrency
+    config.DISPATCH_QUEUE_SIZE = args.dispatch_queue_size
+    config.DISPATCH_CHANNEL_BURST = args.channel_burst
+    config.DISPATCH_CHANNEL_PERIOD = args.channel_period
+    config.OUTBOX_RETRY_BASE = args.outbox_retry_base
+
+    routes = max(e["route"] for e in events) + 1
+    topics = {CHANNEL_BASE + r: {} for r in range(routes)}
+    if not args.unknown_topics:
+        for e in events:
+            if e.get("topic"):
+                topics[CHANNEL_BASE + e["route"]][e["topic"]] = f"Tópico {e['topic']}"
+
+    telegram_client = FakeTelegramClient(
+        latency={
+            "get_sender": latency(args.sender_latency, args.jitter),
+            "request": latency(args.telegram_latency, args.jitter),
+            "download": latency(args.download_latency, args.jitter),
+        },
+        bandwidth=args.bandwidth,
+        topics=topics
+    )
+    discord_client = FakeDiscordClient(
+        latency={
+            "send": latency(args.send_latency, args.jitter),
+            "edit": latency(args.edit_latency, args.jitter),
+            "delete": latency(args.edit_latency, args.jitter),
+            "create_text_channel": latency(args.create_channel_latency, args.jitter),
+            "webhook_send": latency(args.webhook_latency, args.jitter),
+            "webhook_edit": latency(args.webhook_latency, args.jitter),
+            "webhook_delete": latency(args.webhook_latency, args.jitter),
+        },
+        faults=DiscordFaults(args.rate_limit_ratio, args.retry_after, args.upload_limit, args.server_error_ratio)
+    )
+    guild = discord_client.add_guild(GUILD_ID)
+    default_channel = guild.add_channel("geral")
+
+    media_fetcher = MediaFetcher(telegram_client, max_downloads=args.max_downloads)
+    message_filter = MessageFilter(args.filters)
+    message_filter.load()
+    channel_resolver = ChannelResolver()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStore(os.path.join(tmp, "bench.db"))
+        await store.open()
+
+        webhooks = FakeWebhookRegistry(discord_client, store) if args.webhooks else None
+
+        media_cache = None
+        if args.media_cache:
+            media_cache = MediaCache(store, max_entries=args.media_cache)
+            await media_cache.load()
+
+        # one concurrency cap for every route, as in main()
+        send_slots = asyncio.Semaphore(args.dispatch_concurrency)
+        
+        bridges = []
+        for r in range(routes):
+            route = Route(utils.get_peer_id(types.PeerChannel(CHANNEL_BASE + r)), GUILD_ID, default_channel.id)
+            bridge = RouteBridge(route, telegram_client, discord_client, store, media_fetcher, channel_resolver, webhooks, media_cache, message_filter, send_slots)
+            await bridge.start()
+            bridge.check_discord()
+            bridge.start_outbox()
+            bridges.append(bridge)
+        handlers = TelegramHandlers(bridges)
+        await handlers.release()
+        register_metrics(bridges, media_fetcher, media_cache)
+
+        # warm-up calls made by start() are not part of the measurement
+        telegram_client.log.calls.clear()
+
+        latencies = []
+        deliveries = []
+
+        def track(future, started_at):
+            def done(f):
+                if not f.cancelled() and not f.exception():
+                    latencies.append(time.perf_counter() - started_at)
+            future.add_done_callback(done)
+            deliveries.append(future)
+
+        async def handle(event):
+            started_at = time.perf_counter()
+            route = event["route"]
+            chat_id = utils.get_peer_id(types.PeerChannel(CHANNEL_BASE + route))
+
+            if event["type"] == "album":
+                messages = [build_message(telegram_client, route, event, part, event["grouped_id"]) for part in event["parts"]]
+                future = await handlers.on_album(SimpleNamespace(chat_id=chat_id, messages=messages))
+            elif event["type"] == "edit":
+                message = build_message(telegram_client, route, event)
+                future = await handlers.on_edit(SimpleNamespace(chat_id=chat_id, message=message))
+            else:
+                message = build_message(telegram_client, route, event)
+                future = await handlers.on_new_message(SimpleNamespace(chat_id=chat_id, message=message))
+
+            if future is not None:
+                track(future, started_at)
+
+        started_at = time.perf_counter()
+        tasks = []
+        for event in events:
+            if args.rate or args.events:
+                delay = event["at"] - (time.perf_counter() - started_at)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            # telethon runs each update handler in its own task
+            tasks.append(asyncio.create_task(handle(event)))
+
+        await asyncio.gather(*tasks)
+        for bridge in bridges:
+            if bridge.coalescer:
+                await bridge.coalescer.flush_all()
+        await asyncio.gather(*deliveries, return_exceptions=True)
+
+        # transient failures are retried by the outbox after the first attempt
+        while any(len(bridge.outbox) for bridge in bridges) and time.perf_counter() - started_at < args.drain_timeout:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started_at
+        outbox_pending = sum(len(bridge.outbox) for bridge in bridges)
+
+        # read the gauges before the queues are torn down
+        summary = metrics.summary()
+
+        for bridge in bridges:
+            await bridge.close()
+        await store.close()
+
+    forwarded = sum(len(e["parts"]) if e["type"] == "album" else 1 for e in events)
+    discord_calls = discord_client.log.total("discord.")
+    return {
+        "events": len(events),
+        "messages": forwarded,
+        "elapsed_seconds": elapsed,
+        "messages_per_second": forwarded / elapsed if elapsed else 0,
+        "latency_p50_seconds": percentile(latencies, 0.50),
+        "latency_p99_seconds": percentile(latencies, 0.99),
+        "latency_max_seconds": max(latencies, default=0),
+        "outbox_pending": outbox_pending,
+        "discord_calls": discord_calls,
+        "discord_calls_per_message": discord_calls / forwarded if forwarded else 0,
+        "discord_calls_by_type": discord_client.log.calls,
+        "telegram_calls_by_type": telegram_client.log.calls,
+        "channels_created": discord_client.log.calls.get("discord.create_text_channel", 0),
+        "bytes_downloaded": media_fetcher.stats()["bytes_downloaded"],
+        "metrics_summary": summary,
+    }
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO if args.verbose else logging.ERROR
+    )
+
+    if args.events:
+        events = scenario.load(args.events)
+    else:
+        events = scenario.generate(
+            messages=args.messages,
+            routes=args.routes,
+            topics=args.topics,
+            rate=args.rate,
+            burst=args.burst,
+            media_ratio=args.media_ratio,
+            album_ratio=args.album_ratio,
+            edit_ratio=args.edit_ratio,
+            long_ratio=args.long_ratio,
+            media_size=args.media_size,
+            large_ratio=args.large_ratio,
+            repeat_ratio=args.repeat_ratio,
+            upload_limit=args.upload_limit,
+            seed=args.seed
+        )
+    if args.save_events:
+        scenario.save(events, args.save_events)
+
+    result = asyncio.run(replay(args, events))
+
+    # peak resident memory of the whole process (kilobytes on linux)
+    if resource:
+        result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(f"Eventos: {result['events']} ({result['messages']} mensagens) em {result['elapsed_seconds']:.2f}s")
+    print(f"Vazão: {result['messages_per_second']:.1f} mensagens/s")
+    print(f"Latência: p50={result['latency_p50_seconds'] * 1000:.0f}ms p99={result['latency_p99_seconds'] * 1000:.0f}ms max={result['latency_max_seconds'] * 1000:.0f}ms")
+    print(f"Chamadas ao Discord: {result['discord_calls']} ({result['discord_calls_per_message']:.2f} por mensagem) {result['discord_calls_by_type']}")
+    print(f"Chamadas ao Telegram: {result['telegram_calls_by_type']}")
+    print(f"Outbox pendente ao final: {result['outbox_pending']}")
+    if "peak_rss_kb" in result:
+        print(f"Pico de memória: {result['peak_rss_kb'] / 1024:.1f} MB")
+    print(f"Métricas: {result['metrics_summary']}")
+
+    if args.json:
+        result["metrics"] = metrics.render()
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+from telethon.tl import types, functions
+from telethon import utils
+from types import SimpleNamespace
+import datetime
+import asyncio
+import random
+import discord
+
+
+# latency of one simulated api call, in seconds
+class Latency:
+    def __init__(self, mean=0.0, jitter=0.0):
+        self.mean = mean
+        self.jitter = jitter
+
+    async def wait(self):
+        delay = self.mean + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# counts every call made against the fakes
+class CallLog:
+    def __init__(self):
+        self.calls = {}
+
+    def add(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def total(self, prefix=""):
+        return sum(n for name, n in self.calls.items() if name.startswith(prefix))
+
+
+def forum_topic(topic_id, title):
+    return types.ForumTopic(
+        id=topic_id,
+        date=None,
+        title=title,
+        icon_color=0,
+        top_message=topic_id,
+        read_inbox_max_id=0,
+        read_outbox_max_id=0,
+        unread_count=0,
+        unread_mentions_count=0,
+        unread_reactions_count=0,
+        from_id=types.PeerUser(1),
+        notify_settings=types.PeerNotifySettings()
+    )
+
+
+# stand-in for the media of a telegram message (message.file / message.document)
+class FakeFile:
+    def __init__(self, size, name, ext):
+        self.size = size
+        self.name = name
+        self.ext = ext
+
+
+class FakeSender:
+    def __init__(self, sender_id, first_name):
+        self.id = sender_id
+        self.first_name = first_name
+        self.last_name = None
+        self.username = None
+
+
+# stand-in for telethon's Message with the attributes the bridge reads
+class FakeMessage:
+    def __init__(self, client, channel_id, message_id, text="", topic_id=None, sender=None,
+                 media_size=None, document=False, grouped_id=None, edit_date=None, media_id=None):
+        self._client = client
+        self.id = message_id
+        self.text = text
+        self.message = text
+        self.peer_id = types.PeerChannel(channel_id)
+        self.chat_id = utils.get_peer_id(self.peer_id)
+        self.grouped_id = grouped_id
+        self.date = datetime.datetime.now(datetime.timezone.utc)
+        self.edit_date = edit_date
+        self.reply_to = SimpleNamespace(reply_to_top_id=topic_id, reply_to_msg_id=topic_id, forum_topic=bool(topic_id)) if topic_id else None
+        self._sender = sender
+        self.sender_id = sender.id if sender else None
+        client.messages[(channel_id, message_id)] = self
+
+        self.media = None
+        self.file = None
+        self.document = None
+        self.photo = None
+        if media_size is not None:
+            media_id = media_id or message_id
+            if document:
+                self.document = SimpleNamespace(id=media_id, size=media_size)
+                self.media = SimpleNamespace(document=self.document)
+                self.file = FakeFile(media_size, f"{media_id}.bin", ".bin")
+            else:
+                self.photo = SimpleNamespace(id=media_id)
+                self.media = SimpleNamespace(photo=self.photo)
+                self.file = FakeFile(media_size, None, ".jpg")
+
+    async def get_sender(self):
+        self._client.log.add("telegram.get_sender")
+        await self._client.latency["get_sender"].wait()
+        return self._sender
+
+    async def download_media(self, file, progress_callback=None):
+        return await self._client.download(self, file, progress_callback)
+
+
+# stand-in for TelegramClient: entities, forum topics and media downloads
+class FakeTelegramClient:
+    def __init__(self, latency=None, bandwidth=50 * 1024 * 1024, topics=None):
+        self.log = CallLog()
+        self.bandwidth = bandwidth
+
+        # {call: Latency}
+        self.latency = {"get_sender": Latency(), "request": Latency(), "download": Latency()}
+        self.latency.update(latency or {})
+
+        # {channel_id: {topic_id: title}}
+        self.topics = topics or {}
+
+        # latest version of every message, as get_messages would return it: {(channel_id, message_id): FakeMessage}
+        self.messages = {}
+
+    async def get_entity(self, peer):
+        self.log.add("telegram.get_entity")
+        channel_id, _ = utils.resolve_id(int(peer))
+        return types.Channel(id=channel_id, title=f"Canal {channel_id}", photo=types.ChatPhotoEmpty(), date=None, forum=True)
+
+    async def get_messages(self, entity, ids):
+        self.log.add("telegram.get_messages")
+        await self.latency["request"].wait()
+        return [self.messages.get((entity.id, i)) for i in ids]
+
+    async def __call__(self, request):
+        self.log.add(f"telegram.{type(request).__name__}")
+        await self.latency["request"].wait()
+
+        topics = self.topics.get(request.channel.id, {})
+        if isinstance(request, functions.channels.GetForumTopicsRequest):
+            # everything fits in one page
+            found = [forum_topic(i, title) for i, title in topics.items()][:request.limit]
+        elif isinstance(request, functions.channels.GetForumTopicsByIDRequest):
+            found = [forum_topic(i, topics[i]) for i in request.topics if i in topics]
+        else:
+            raise NotImplementedError(type(request).__name__)
+        return SimpleNamespace(topics=found, messages=[], count=len(found))
+
+    async def _stream(self, size):
+        # simulated transfer time, in 512KB chunks
+        chunk = 512 * 1024
+        sent = 0
+        while sent < size:
+            n = min(chunk, size - sent)
+            await asyncio.sleep(n / self.bandwidth)
+            yield n
+            sent += n
+
+    async def download(self, message, file, progress_callback=None):
+        self.log.add("telegram.download_media")
+        await self.latency["download"].wait()
+
+        received = 0
+        async for n in self._stream(message.file.size):
+            file.write(b"\0" * n)
+            received += n
+            if progress_callback:
+                progress_callback(received, message.file.size)
+        return file
+
+    async def iter_download(self, document, offset=0, limit=None, request_size=512 * 1024, file_size=None):
+        self.log.add("telegram.iter_download")
+        await self.latency["download"].wait()
+
+        end = min(file_size, offset + limit * request_size) if limit else file_size
+        position = offset
+        while position < end:
+            n = min(request_size, end - position)
+            await asyncio.sleep(n / self.bandwidth)
+            yield b"\0" * n
+            position += n
+
+
+class _Response:
+    def __init__(self, status, reason):
+        self.status = status
+        self.reason = reason
+
+
+# what the fake discord rejects: 429 or 503 with these probabilities, 413 above this size
+class DiscordFaults:
+    def __init__(self, rate_limit_ratio=0.0, retry_after=1.0, max_upload=10 * 1024 * 1024, server_error_ratio=0.0):
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.max_upload = max_upload
+        self.server_error_ratio = server_error_ratio
+
+
+class FakeDiscordMessage:
+    def __init__(self, channel, message_id, content=None, attachments=None):
+        self.channel = channel
+        self.id = message_id
+        self.content = content
+        self.attachments = attachments or []
+
+    async def edit(self, content=None, attachments=None):
+        await self.channel._call("edit")
+        if content is not None:
+            self.content = content
+
+    async def delete(self):
+        await self.channel._call("delete")
+
+
+# stand-in for discord.TextChannel
+class FakeTextChannel:
+    def __init__(self, client, guild, channel_id, name):
+        self.client = client
+        self.guild = guild
+        self.id = channel_id
+        self.name = name
+        self.messages = []
+
+    async def _call(self, name):
+        self.client.log.add(f"discord.{name}")
+        await self.client.latency[name].wait()
+
+        faults = self.client.faults
+        if faults.rate_limit_ratio and random.random() < faults.rate_limit_ratio:
+            self.client.log.add("fault.429")
+            raise discord.errors.RateLimited(faults.retry_after)
+        if faults.server_error_ratio and random.random() < faults.server_error_ratio:
+            self.client.log.add("fault.503")
+            raise discord.errors.DiscordServerError(_Response(503, "Service Unavailable"), "upstream connect error")
+
+    async def _post(self, call, content=None, file=None, files=None, embed=None):
+        await self._call(call)
+
+        files = files or ([file] if file else [])
+        attachments = []
+        for f in files:
+            f.fp.seek(0, 2)
+            size = f.fp.tell()
+            attachments.append(SimpleNamespace(
+                url=f"https://cdn.example/attachments/{self.id}/{f.filename}",
+                filename=f.filename,
+                size=size,
+                content_type="image/jpeg" if f.filename.endswith(".jpg") else "application/octet-stream"
+            ))
+        if sum(a.size for a in attachments) > self.client.faults.max_upload:
+            self.client.log.add("fault.413")
+            raise discord.errors.HTTPException(_Response(413, "Payload Too Large"), "Request entity too large")
+
+        message = FakeDiscordMessage(self, self.client.next_id(), content, attachments)
+        self.messages.append(message)
+        self.client.delivered(self, message)
+        return message
+
+    async def send(self, content=None, file=None, files=None, embed=None):
+        return await self._post("send", content, file, files, embed)
+
+    def get_partial_message(self, message_id):
+        return FakeDiscordMessage(self, message_id)
+
+    async def webhooks(self):
+        return list(self.client.webhooks_by_channel.get(self.id, []))
+
+    async def create_webhook(self, name, avatar=None):
+        self.client.log.add("discord.create_webhook")
+        webhook = FakeWebhook(self, self.client.next_id(), name)
+        self.client.webhooks[webhook.id] = webhook
+        self.client.webhooks_by_channel.setdefault(self.id, []).append(webhook)
+        return webhook
+
+
+# stand-in for discord.Webhook; executions have their own latency
+class FakeWebhook:
+    def __init__(self, channel, webhook_id, name):
+        self.channel = channel
+        self.id = webhook_id
+        self.name = name
+        self.token = f"token-{webhook_id}"
+        self.user = channel.client.user
+
+    async def send(self, content=None, username=None, avatar_url=None, wait=False, file=None, files=None, embed=None):
+        return await self.channel._post("webhook_send", content, file, files, embed)
+
+    async def edit_message(self, message_id, content=None, attachments=None):
+        await self.channel._call("webhook_edit")
+
+    async def delete_message(self, message_id):
+        await self.channel._call("webhook_delete")
+
+
+class FakeGuild:
+    def __init__(self, client, guild_id, filesize_limit):
+        self.client = client
+        self.id = guild_id
+        self.name = f"Servidor {guild_id}"
+        self.filesize_limit = filesize_limit
+        self.channels = {}
+
+    @property
+    def text_channels(self):
+        return list(self.channels.values())
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def add_channel(self, name, channel_id=None):
+        channel = FakeTextChannel(self.client, self, channel_id or self.client.next_id(), name)
+        self.channels[channel.id] = channel
+        self.client.channels[channel.id] = channel
+        return channel
+
+    async def create_text_channel(self, name, topic=None):
+        self.client.log.add("discord.create_text_channel")
+        await self.client.latency["create_text_channel"].wait()
+        return self.add_channel(name)
+
+
+# stand-in for discord.Client with the guild and channel lookups the bridge uses
+class FakeDiscordClient:
+    def __init__(self, latency=None, faults=None, on_delivered=None):
+        self.log = CallLog()
+        self.faults = faults or DiscordFaults()
+        self.on_delivered = on_delivered
+
+        # {call: Latency}
+        self.latency = {
+            "send": Latency(), "edit": Latency(), "delete": Latency(), "create_text_channel": Latency(),
+            "webhook_send": Latency(), "webhook_edit": Latency(), "webhook_delete": Latency(),
+        }
+        self.latency.update(latency or {})
+
+        self.user = SimpleNamespace(id=1)
+        self.guilds = {}
+        self.channels = {}
+
+        # {webhook_id: FakeWebhook}, {channel_id: [FakeWebhook]}
+        self.webhooks = {}
+        self.webhooks_by_channel = {}
+        self._next_id = 1000
+
+    def next_id(self):
+        self._next_id += 1
+        return self._next_id
+
+    def add_guild(self, guild_id, filesize_limit=None):
+        guild = FakeGuild(self, guild_id, filesize_limit or self.faults.max_upload)
+        self.guilds[guild_id] = guild
+        return guild
+
+    def get_guild(self, guild_id):
+        return self.guilds.get(guild_id)
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def delivered(self, channel, message):
+        if self.on_delivered:
+            self.on_delivered(channel, message)
@@ -0,0 +1,96 @@
+import random
+import json
+
+# event stream format, one json object per line:
+#   {"at": 0.0, "route": 0, "type": "message", "id": 1, "topic": 5, "sender": 2, "text": "...", "media_size": null, "document": false, "media_id": null}
+#   {"at": 0.1, "route": 0, "type": "album", "topic": 5, "sender": 2, "grouped_id": 9, "parts": [{"id": 2, "text": "", "media_size": 1000}]}
+#   {"at": 0.2, "route": 0, "type": "edit", "id": 1, "topic": 5, "sender": 2, "text": "..."}
+# "at" is the offset in seconds from the start of the replay; "media_id" (telegram photo/document id)
+# defaults to the message id, a repeated one is a repost of the same file
+
+
+def _text(length):
+    words = []
+    size = 0
+    while size < length:
+        word = random.choice(["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit."])
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def generate(messages=1000, routes=1, topics=20, rate=50, burst=5, media_ratio=0.1, album_ratio=0.05,
+             edit_ratio=0.05, long_ratio=0.02, media_size=512 * 1024, large_ratio=0.01,
+             repeat_ratio=0.0, upload_limit=10 * 1024 * 1024, seed=0):
+    """
+    Gera um fluxo sintético com rajadas de texto, mídias (repetidas ou não), álbuns, edições e
+    textos longos espalhados pelos tópicos
+    """
+    random.seed(seed)
+    events = []
+    next_id = {}
+    sent = {}
+    at = 0.0
+    grouped_id = 0
+    media = []
+
+    while len(events) < messages:
+        route = random.randrange(routes)
+        topic = random.randint(1, topics) if topics else None
+        sender = random.randint(1, 50)
+        roll = random.random()
+
+        def new_id():
+            next_id[route] = next_id.get(route, 0) + 1
+            return next_id[route]
+
+        def size():
+            if random.random() < large_ratio:
+                return upload_limit + random.randint(1, upload_limit)
+            return max(1, int(random.expovariate(1 / media_size)))
+
+        if roll < edit_ratio and sent.get(route):
+            original = random.choice(sent[route])
+            events.append({"at": at, "route": route, "type": "edit", "id": original["id"], "topic": original["topic"],
+                           "sender": original["sender"], "text": _text(random.randint(10, 200)),
+                           "media_size": original.get("media_size"), "document": original.get("document", False)})
+        elif roll < edit_ratio + album_ratio:
+            grouped_id += 1
+            parts = [{"id": new_id(), "text": "", "media_size": size()} for _ in range(random.randint(2, 10))]
+            parts[0]["text"] = _text(random.randint(0, 100))
+            events.append({"at": at, "route": route, "type": "album", "topic": topic, "sender": sender,
+                           "grouped_id": grouped_id, "parts": parts})
+        elif roll < edit_ratio + album_ratio + media_ratio:
+            event = {"at": at, "route": route, "type": "message", "id": new_id(), "topic": topic, "sender": sender,
+                     "text": _text(random.randint(0, 200)), "media_size": size(), "document": random.random() < 0.5}
+            if media and random.random() < repeat_ratio:
+                event.update(random.choice(media))
+            else:
+                media.append({"media_id": event["id"], "media_size": event["media_size"], "document": event["document"]})
+            events.append(event)
+            sent.setdefault(route, []).append(event)
+        else:
+            # a burst of short texts from the same sender in the same topic
+            for _ in range(random.randint(1, burst)):
+                length = random.randint(2000, 6000) if random.random() < long_ratio else random.randint(5, 300)
+                event = {"at": at, "route": route, "type": "message", "id": new_id(), "topic": topic, "sender": sender,
+                         "text": _text(length), "media_size": None, "document": False}
+                events.append(event)
+                sent.setdefault(route, []).append(event)
+                at += random.uniform(0, 0.05)
+
+        if rate:
+            at += random.expovariate(rate)
+
+    return events[:messages]
+
+
+def load(path):
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save(events, path):
+    with open(path, 'w') as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
@@ -0,0 +1,850 @@
+from telethon import utils
+from collections import OrderedDict
+import asyncio
+import logging
+import time
+import discord
+import config
+from topic_registry import TopicRegistry
+from dispatcher import SendDispatcher, PRIORITY_HIGH, PRIORITY_LOW
+from backfill import Checkpoints, run_backfill
+from message_index import MessageIndex, media_key
+from text import split_message, Coalescer
+from media import batch_attachments, upload_limit, media_size, media_filename, file_size, MediaTooLarge
+from metrics import metrics
+from webhooks import UNKNOWN_WEBHOOK, WebhookGone
+from media_cache import content_hash, media_embed
+from outbox import Outbox, TRANSIENT_ERRORS, OUTBOX_MESSAGE, OUTBOX_ALBUM, OUTBOX_EDIT, outbox_key
+from filters import MessageFilter, Rule, DENY
+
+logger = logging.getLogger(__name__)
+
+# coalesced discord messages whose parts are remembered so edits can rebuild them
+MAX_COALESCED_SEGMENTS = 10000
+
+# mapper of telegram topics to discord channels
+class TopicMapper:
+    def __init__(self, origem_id, store):
+        self.origem_id = str(origem_id)
+        self.store = store
+        
+        # map of topics: {id_topico_origem: id_canal_discord}
+        self.topic_mapping = {}
+    
+    async def load(self):
+        try:
+            self.topic_mapping = await self.store.load_topic_mappings(self.origem_id)
+            logger.info(f"Mapeamento de tópicos carregado: {len(self.topic_mapping)} tópicos")
+        except Exception as e:
+            logger.error(f"Erro ao carregar mapeamento de tópicos: {e}")
+            self.topic_mapping = {}
+    
+    def get_discord_channel_id(self, origem_topic_id):
+        return self.topic_mapping.get(origem_topic_id)
+    
+    def add_topic_mapping(self, origem_topic_id, discord_channel_id):
+        self.topic_mapping[origem_topic_id] = discord_channel_id
+        
+        # persisted by the store's background writer, off the event loop
+        self.store.put_topic_mapping(self.origem_id, origem_topic_id, discord_channel_id)
+        logger.info(f"Novo mapeamento de tópico adicionado: {origem_topic_id} -> {discord_channel_id}")
+
+def get_topic_id(message):
+    topic_id = None
+    
+    if hasattr(message, 'reply_to') and message.reply_to:
+        if hasattr(message.reply_to, 'reply_to_top_id') and message.reply_to.reply_to_top_id:
+            topic_id = message.reply_to.reply_to_top_id
+        elif hasattr(message.reply_to, 'forum_topic') and message.reply_to.forum_topic:
+            if not isinstance(message.reply_to.forum_topic, bool) and hasattr(message.reply_to.forum_topic, 'id'):
+                topic_id = message.reply_to.forum_topic.id
+            
+            # a message posted straight into a topic "replies" to the topic's first message
+            elif getattr(message.reply_to, 'reply_to_msg_id', None):
+                topic_id = message.reply_to.reply_to_msg_id
+    
+    if not topic_id and hasattr(message, 'forum_topic') and message.forum_topic:
+        if not isinstance(message.forum_topic, bool) and hasattr(message.forum_topic, 'id'):
+            topic_id = message.forum_topic.id
+    
+    return topic_id
+
+async def get_sender_name(message):
+    with metrics.timer("get_sender"):
+        sender = await message.get_sender()
+    sender_name = getattr(sender, 'first_name', '') or getattr(sender, 'title', '')
+    if hasattr(sender, 'last_name') and sender.last_name:
+        sender_name += f" {sender.last_name}"
+    
+    if not sender_name:
+        sender_name = getattr(sender, 'username', '') or f"ID:{sender.id}"
+    
+    return sender_name
+
+# everything needed to mirror one source channel: mapper, caches, index, checkpoints and send queues
+class RouteBridge:
+    def __init__(self, route, telegram_client, discord_client, store, media_fetcher, channel_resolver, webhooks=None,
+                 media_cache=None, message_filter=None, send_slots=None):
+        self.route = route
+        self.telegram_client = telegram_client
+        self.discord_client = discord_client
+        self.store = store
+        
+        # shared by every route, so the download budget is global
+        self.media_fetcher = media_fetcher
+        self.channel_resolver = channel_resolver
+        
+        # optional delivery through channel webhooks, posting as the telegram sender
+        self.webhooks = webhooks
+        
+        # optional, shared by every route: media already on discord is re-posted without a new upload
+        self.media_cache = media_cache
+        
+        # shared allow/deny rules, checked before any api call; the route's ignored topics go first
+        self.message_filter = message_filter or MessageFilter()
+        self.route_rules = [Rule(DENY, name="topicos_ignorados", topics=route.topicos_ignorados)] if route.topicos_ignorados else []
+        
+        # each route gets its own queues, so a noisy source can't starve the others, but the
+        # concurrency cap (send_slots) is shared by every route, like the bot's global rate limit
+        self.dispatcher = SendDispatcher(
+            max_queue=config.DISPATCH_QUEUE_SIZE,
+            max_concurrency=config.DISPATCH_CONCURRENCY,
+            overflow=config.DISPATCH_OVERFLOW,
+            channel_burst=config.DISPATCH_CHANNEL_BURST,
+            channel_period=config.DISPATCH_CHANNEL_PERIOD,
+            max_spill=config.DISPATCH_SPILL_SIZE,
+            semaphore=send_slots
+        )
+        
+        # optional stage merging bursts of short texts into one discord message
+        self.coalescer = Coalescer(config.COALESCE_WINDOW, self.deliver_coalesced) if config.COALESCE_WINDOW > 0 else None
+        
+        # parts of the coalesced messages: {discord_message_id: [(telegram_message_id, text)]}
+        self.coalesced_segments = OrderedDict()
+        
+        self.entity = None
+        self.origem_id = None
+        self.chat_id = None
+    
+    async def start(self):
+        """
+        Resolve o canal de origem e carrega o estado persistido da rota
+        """
+        await self.resolve()
+        await self.load()
+    
+    async def resolve(self):
+        """
+        Resolve o canal de origem; depois disso a rota já pode receber eventos
+        """
+        self.entity = await self.telegram_client.get_entity(self.route.canal_origem)
+        self.origem_id = self.entity.id
+        self.chat_id = utils.get_peer_id(self.entity)
+        
+        logger.info(f"Canal de origem: {getattr(self.entity, 'title', self.route.canal_origem)} (ID: {self.origem_id})")
+        logger.info(f"TÓPICOS IGNORADOS: {self.route.topicos_ignorados}")
+    
+    async def load(self):
+        """
+        Carrega o estado persistido e os títulos dos tópicos, tudo em paralelo
+        """
+        # instance of the topic mapper
+        self.topic_mapper = TopicMapper(self.origem_id, self.store)
+        
+        # telegram -> discord message ids, used to edit in place
+        self.message_index = MessageIndex(
+            self.store,
+            self.origem_id,
+            max_entries=config.MESSAGE_INDEX_MAX,
+            retention_days=config.MESSAGE_INDEX_RETENTION_DAYS
+        )
+        
+        # events not yet on discord, replayed once discord is ready
+        self.outbox = Outbox(
+            self.store,
+            self.origem_id,
+            self.chat_id,
+            max_attempts=config.OUTBOX_MAX_ATTEMPTS,
+            retry_base=config.OUTBOX_RETRY_BASE,
+            retry_max=config.OUTBOX_RETRY_MAX
+        )
+        
+        # last forwarded message per topic and channel-wide watermark, used to catch up after downtime;
+        # events still in the outbox hold the watermark back
+        self.checkpoints = Checkpoints(self.store, self.origem_id, pending_ids=self.outbox.pending_ids)
+        
+        # every topic title loaded once, later lookups are served from memory
+        self.topic_registry = TopicRegistry(self.telegram_client, self.entity, ttl=config.TOPIC_CACHE_TTL, max_size=config.TOPIC_CACHE_MAX)
+        
+        # the store reads share one thread, but they overlap with the topic requests to telegram
+        await asyncio.gather(
+            self.topic_mapper.load(),
+            self.message_index.load(),
+            self.checkpoints.load(),
+            self.outbox.load(),
+            self.topic_registry.load_all()
+        )
+    
+    def check_discord(self):
+        # check channels and permissions
+        guild = self.discord_client.get_guild(self.route.discord_guild_id)
+        if not guild:
+            logger.error(f"Não foi possível encontrar o servidor Discord com ID {self.route.discord_guild_id}")
+            return False
+        
+        self.channel_resolver.index_guild(guild)
+            
+        channel = guild.get_channel(self.route.discord_channel_id)
+        if not channel:
+            logger.error(f"Não foi possível encontrar o canal Discord com ID {self.route.discord_channel_id}")
+            return False
+            
+        logger.info(f"Servidor Discord: {guild.name} (ID: {guild.id})")
+        logger.info(f"Canal Discord principal: {channel.name} (ID: {channel.id})")
+        return True
+    
+    def handle_service_message(self, message):
+        # keep topic titles fresh when topics are created or renamed
+        if self.topic_registry.handle_service_message(message):
+            logger.info(f"Cache de tópicos: {self.topic_registry.stats()}")
+    
+    async def backfill(self):
+        # forward whatever was posted while the bridge was down
+        return await run_backfill(
+            self.telegram_client,
+            self.entity,
+            self.checkpoints,
+            self.message_index,
+            get_topic_id,
+            self.forward_message,
+            self.forward_album,
+            log_every=config.BACKFILL_LOG_EVERY,
+            concurrency=config.BACKFILL_CONCURRENCY,
+            send_rate=config.BACKFILL_SEND_RATE,
+            max_gap=config.BACKFILL_MAX_GAP
+        )
+    
+    def forwarded(self, message):
+        # at or below the topic checkpoint, or in the index: the backfill (or the outbox) already handled it
+        topic_id = get_topic_id(message)
+        return message.id <= self.checkpoints.get(topic_id) or self.message_index.get(topic_id, message.id) is not None
+
+    async def replay(self, key, entry):
+        """
+        Reprocessa um evento do outbox, buscando as mensagens de novo no Telegram
+        """
+        messages = [m for m in await self.telegram_client.get_messages(self.entity, ids=entry["message_ids"]) if m]
+        if not messages:
+            logger.warning(f"Mensagens do evento {key} não existem mais no Telegram")
+            return
+        
+        # a newer edit replaces the one recorded
+        if outbox_key(self.chat_id, messages[0]) != key:
+            self.outbox.ack(key)
+        
+        if entry["kind"] == OUTBOX_EDIT:
+            await self.handle_edit(messages[0])
+            return
+        
+        # delivered before the crash, only the acknowledgement was lost
+        if self.message_index.get(get_topic_id(messages[0]), messages[0].id):
+            return
+        
+        if entry["kind"] == OUTBOX_ALBUM:
+            await self.forward_album(messages)
+        else:
+            await self.forward_message(messages[0])
+    
+    def start_outbox(self):
+        self.outbox.start(self.replay)
+    
+    async def close(self):
+        self.outbox.stop()
+        if self.coalescer:
+            await self.coalescer.flush_all()
+        await self.dispatcher.close()
+
+    def count(self, outcome, n=1):
+        metrics.count("messages", n, outcome=outcome, route=self.origem_id)
+
+    def filtered(self, message, text=None):
+        """
+        Diz se a mensagem deve ser descartada pelos filtros, olhando apenas a mensagem recebida
+        """
+        rule, allowed = self.message_filter.match(message, self.chat_id, get_topic_id(message), self.route_rules, text)
+        if allowed:
+            return False
+        
+        self.count("ignored")
+        metrics.count("filtered", rule=rule.name if rule else "default")
+        logger.debug(f"Mensagem {message.id} descartada pelo filtro {rule.name if rule else 'padrão'}")
+        return True
+
+    async def get_author(self, discord_channel, message, sender_name):
+        """
+        Retorna o autor para envio pelo webhook do canal, ou None quando o envio é feito pelo bot
+        (e o remetente vai como prefixo do texto)
+        """
+        if not self.webhooks:
+            return None
+        
+        webhook = await self.webhooks.get(discord_channel)
+        if not webhook:
+            return None
+        return await self.webhooks.author(webhook, message, sender_name)
+
+    async def send(self, discord_channel, author, *args, **kwargs):
+        with metrics.timer("send"):
+            if not author:
+                return await discord_channel.send(*args, **kwargs)
+            
+            try:
+                return await author.send(*args, **kwargs)
+            except discord.errors.NotFound as e:
+                if e.code != UNKNOWN_WEBHOOK:
+                    raise
+            
+            # the webhook was deleted on discord: post once more through a new one, which the
+            # job's next sends reuse; without one the event goes back to the outbox
+            self.webhooks.invalidate(discord_channel.id, author.webhook.id)
+            webhook = await self.webhooks.get(discord_channel)
+            if not webhook:
+                raise WebhookGone(discord_channel.id)
+            author.webhook = webhook
+
+            # the failed request read the attachments to the end; discord.py only rewinds them on its own retries
+            files = kwargs.get("files") or ([kwargs["file"]] if kwargs.get("file") else [])
+            for f in files:
+                f.reset()
+            return await author.send(*args, **kwargs)
+
+    async def send_media(self, discord_channel, author, message, caption):
+        """
+        Envia a mídia da mensagem. Arquivos já enviados antes são reapresentados pela URL do
+        primeiro envio, sem download (mesmo ID no Telegram) ou sem upload (mesmo conteúdo).
+        """
+        key = media_key(message)
+        if self.media_cache and key:
+            cached = self.media_cache.get(key)
+            if cached:
+                return await self.send(discord_channel, author, content=caption, embed=media_embed(cached))
+        
+        # stream the media into a discord file and send it
+        digest = None
+        async with self.media_fetcher.fetch(message, upload_limit(discord_channel.guild)) as discord_file:
+            if self.media_cache:
+                digest = await content_hash(discord_file.fp)
+                cached = self.media_cache.get(digest)
+                if cached:
+                    return await self.send(discord_channel, author, content=caption, embed=media_embed(cached))
+            
+            sent = await self.send(discord_channel, author, content=caption, file=discord_file)
+        
+        if self.media_cache and sent.attachments:
+            attachment = sent.attachments[0]
+            image = (attachment.content_type or "").startswith("image/")
+            for k in (key, digest):
+                if k:
+                    self.media_cache.put(k, attachment.url, attachment.filename, attachment.size, image)
+        return sent
+
+    async def edit_message(self, discord_channel, message_id, webhook=None, **kwargs):
+        # webhook messages can only be edited through the webhook that sent them
+        if webhook:
+            return await webhook.edit_message(message_id, **kwargs)
+        return await discord_channel.get_partial_message(message_id).edit(**kwargs)
+
+    async def delete_message(self, discord_channel, message_id, webhook=None):
+        if webhook:
+            return await webhook.delete_message(message_id)
+        return await discord_channel.get_partial_message(message_id).delete()
+
+    async def get_or_create_discord_channel(self, topic_title, telegram_topic_id):
+        """
+        Obtém ou cria um canal no Discord com o mesmo título do tópico do Telegram
+        """
+        discord_channel_id = self.topic_mapper.get_discord_channel_id(telegram_topic_id)
+        if discord_channel_id:
+            # check if exists
+            channel = self.discord_client.get_channel(discord_channel_id)
+            if channel:
+                return channel
+        
+        try:
+            guild = self.discord_client.get_guild(self.route.discord_guild_id)
+            if not guild:
+                logger.error("Servidor Discord não encontrado")
+                return None
+            
+            # indexed lookup, concurrent misses for the same topic share one creation
+            with metrics.timer("channel_resolve"):
+                channel = await self.channel_resolver.resolve(guild, topic_title, telegram_topic_id)
+            
+            if self.topic_mapper.get_discord_channel_id(telegram_topic_id) != channel.id:
+                self.topic_mapper.add_topic_mapping(telegram_topic_id, channel.id)
+            return channel
+            
+        except discord.errors.Forbidden:
+            logger.error("Erro ao criar canal: Permissões insuficientes no Discord")
+            return None
+        except Exception as e:
+            logger.error(f"Erro ao criar canal Discord para tópico '{topic_title}': {e}")
+            return None
+
+    async def get_topic_info(self, message):
+        topic_id = get_topic_id(message)
+        
+        if not topic_id:
+            return None, None
+        
+        with metrics.timer("topic_info"):
+            topic_title = await self.topic_registry.get_title(topic_id)
+        return topic_id, topic_title
+
+    async def edit_in_place(self, discord_channel, entry, message, topic_id, sender_name):
+        """
+        Edita as mensagens já enviadas ao Discord, reenviando a mídia apenas se o arquivo mudou.
+        Retorna False quando não é possível editar e a edição deve ser reenviada.
+        """
+        message_ids = entry["message_ids"]
+        
+        # edit the way the original was sent: through the webhook, or by the bot with the sender prefix
+        author = webhook = None
+        prefix = f"{sender_name} - "
+        if entry["webhook"]:
+            author = await self.get_author(discord_channel, message, sender_name)
+            if not author:
+                return False
+            webhook = author.webhook
+            prefix = ""
+        
+        if entry["coalesced"]:
+            return await self.edit_coalesced(discord_channel, entry, message, prefix, webhook)
+        
+        if entry["album"] or message.media:
+            caption = f"{prefix}{message.text}" if message.text else prefix.rstrip(" -")
+            new_media_key = media_key(message)
+            
+            if entry["album"] or new_media_key == entry["media_key"]:
+                # only the caption changed
+                await self.edit_message(discord_channel, message_ids[0], webhook, content=caption)
+            else:
+                try:
+                    async with self.media_fetcher.fetch(message, upload_limit(discord_channel.guild)) as discord_file:
+                        await self.edit_message(discord_channel, message_ids[0], webhook, content=caption, attachments=[discord_file])
+                except MediaTooLarge as e:
+                    # the old file no longer matches the message, so it goes away with the placeholder;
+                    # no media key is recorded and the next edit tries the new file again
+                    self.count("too_large")
+                    await self.edit_message(discord_channel, message_ids[0], webhook,
+                        content=f"{caption}\n\n**[ARQUIVO MUITO GRANDE PARA SER ENVIADO]**\n", attachments=[]
+                    )
+                    logger.warning(f"Arquivo muito grande para enviar ao Discord: {e}")
+                    new_media_key = None
+                self.message_index.record(topic_id, message.id, discord_channel.id, message_ids, new_media_key, webhook=entry["webhook"])
+            
+            logger.info(f"Mídia editada no canal Discord: {discord_channel.name}")
+            return True
+        
+        chunks = split_message(f"{prefix}{message.text}")
+        edited_ids = []
+        for i, chunk in enumerate(chunks):
+            if i < len(message_ids):
+                await self.edit_message(discord_channel, message_ids[i], webhook, content=chunk)
+                edited_ids.append(message_ids[i])
+            else:
+                sent = await self.send(discord_channel, author, chunk)
+                edited_ids.append(sent.id)
+        
+        # drop chunks the shorter text no longer needs
+        for message_id in message_ids[len(chunks):]:
+            await self.delete_message(discord_channel, message_id, webhook)
+        
+        self.message_index.record(topic_id, message.id, discord_channel.id, edited_ids, webhook=entry["webhook"])
+        logger.info(f"Mensagem de texto editada no canal Discord: {discord_channel.name}")
+        return True
+
+    async def edit_coalesced(self, discord_channel, entry, message, prefix, webhook=None):
+        """
+        Reconstrói uma mensagem agrupada com o novo texto da parte editada. Retorna False quando
+        as partes não são mais conhecidas ou o resultado não cabe numa mensagem.
+        """
+        discord_message_id = entry["message_ids"][0]
+        segments = self.coalesced_segments.get(discord_message_id)
+        if not segments:
+            return False
+        
+        segments = [(message_id, f"{prefix}{message.text}" if message_id == message.id else text) for message_id, text in segments]
+        content = "\n".join(text for _, text in segments)
+        if len(content) > 2000:
+            return False
+        
+        await self.edit_message(discord_channel, discord_message_id, webhook, content=content)
+        self.coalesced_segments[discord_message_id] = segments
+        logger.info(f"Mensagem agrupada editada no canal Discord: {discord_channel.name}")
+        return True
+
+    async def deliver_coalesced(self, channel_id, items, author=None):
+        """
+        Envia como uma única mensagem do Discord os textos agrupados pelo coalescer
+        """
+        discord_channel = self.discord_client.get_channel(channel_id)
+        
+        async def deliver():
+            try:
+                sent = await self.send(discord_channel, author, "\n".join(text for _, text in items))
+                
+                coalesced = len(items) > 1
+                for (topic_id, message_id), _ in items:
+                    self.message_index.record(topic_id, message_id, channel_id, [sent.id], coalesced=coalesced, webhook=author is not None)
+                
+                if coalesced:
+                    self.coalesced_segments[sent.id] = [(message_id, text) for (_, message_id), text in items]
+                    while len(self.coalesced_segments) > MAX_COALESCED_SEGMENTS:
+                        self.coalesced_segments.popitem(last=False)
+                
+                self.count("forwarded", len(items))
+                logger.info(f"{len(items)} mensagem(ns) de texto enviada(s) para o canal Discord: {discord_channel.name}")
+            except (discord.errors.RateLimited, *TRANSIENT_ERRORS):
+                raise
+            except Exception as e:
+                self.count("error", len(items))
+                logger.error(f"Erro ao enviar texto para Discord: {e}")
+            
+            for (topic_id, message_id), _ in items:
+                self.checkpoints.advance(topic_id, message_id)
+        
+        return await self.dispatcher.submit(channel_id, deliver, priority=PRIORITY_HIGH)
+
+    async def forward_message(self, message):
+        """
+        Encaminha uma mensagem do Telegram para o Discord, retornando o envio enfileirado
+        """
+        received_at = time.perf_counter()
+        key = None
+        try:
+            if self.filtered(message):
+                return
+            
+            # recorded before anything else, so a crash from here on is replayed on the next start
+            key = self.outbox.begin(OUTBOX_MESSAGE, [message])
+            if not key:
+                return
+            
+            sender_name = await get_sender_name(message)
+            
+            topic_id, topic_title = await self.get_topic_info(message)
+            
+            discord_channel = None
+            
+            if topic_id:
+                logger.info(f"Mensagem do tópico: {topic_title} (ID: {topic_id})")
+                discord_channel = await self.get_or_create_discord_channel(topic_title, topic_id)
+            
+            # if no topic or no channel created, use the default channel
+            if not discord_channel:
+                discord_channel = self.discord_client.get_channel(self.route.discord_channel_id)
+            
+            # through a webhook the sender is the message author, otherwise a text prefix
+            author = await self.get_author(discord_channel, message, sender_name)
+            prefix = "" if author else f"{sender_name} - "
+            
+            # short texts may be merged with their neighbours by the coalescer
+            if self.coalescer:
+                formatted_text = f"{prefix}{message.text}"
+                if not message.media and self.coalescer.fits(formatted_text):
+                    return self.outbox.track(key, await self.coalescer.add(discord_channel.id, (topic_id, message.id), formatted_text, author))
+                
+                # anything else flushes the channel's buffer first, to keep the order
+                await self.coalescer.flush(discord_channel.id)
+            
+            # discord ids of the chunks already sent, kept in the outbox: a rerun after a rate limit,
+            # an outbox retry or a replay after a crash resume from the chunk that failed
+            sent_ids = self.outbox.sent(key, discord_channel.id)
+            
+            # deliver through the channel queue so the handler never waits on discord
+            async def deliver():
+                # if has media, download and send
+                if message.media:
+                    logger.info(f"Mensagem com mídia detectada de {sender_name}")
+                
+                    caption = f"{prefix}{message.text}" if message.text else prefix.rstrip(" -")
+                
+                    # send to discord
+                    try:
+                        sent = await self.send_media(discord_channel, author, message, caption)
+                        self.message_index.record(topic_id, message.id, discord_channel.id, [sent.id], media_key(message), webhook=author is not None)
+                        self.count("forwarded")
+                        logger.info(f"Mídia enviada para o canal Discord: {discord_channel.name}")
+                    
+                    except TRANSIENT_ERRORS:
+                        raise
+                    except MediaTooLarge as e:
+                        self.count("too_large")
+                        await self.send(discord_channel, author,
+                            f"{caption}\n\n**[ARQUIVO MUITO GRANDE PARA SER ENVIADO]**\n"
+                        )
+                        logger.warning(f"Arquivo muito grande para enviar ao Discord: {e}")
+                    except discord.errors.HTTPException as e:
+                        metrics.count("discord_errors", status=e.status)
+                        # if file is too large
+                        if e.status == 413: 
+                            self.count("too_large")
+                            await self.send(discord_channel, author,
+                                f"{caption}\n\n**[ARQUIVO MUITO GRANDE PARA SER ENVIADO]**\n"
+                            )
+                            logger.warning(f"Arquivo muito grande para enviar ao Discord: {media_filename(message)}")
+                        else:
+                            self.count("error")
+                            logger.error(f"Erro HTTP ao enviar mídia: {e}")
+                            await self.send(discord_channel, author, f"{caption}\n\n**[ERRO AO ENVIAR MÍDIA]**")
+                    except discord.errors.RateLimited:
+                        raise
+                    except Exception as e:
+                        self.count("error")
+                        logger.error(f"Erro ao enviar mídia para Discord: {e}")
+                        await self.send(discord_channel, author, f"{caption}\n\n**[ERRO AO ENVIAR MÍDIA]**")
+                else:
+                    formatted_text = f"{prefix}{message.text}"
+                
+                    # send to discord
+                    try:
+                        # break the text into chunks if too long
+                        for chunk in split_message(formatted_text)[len(sent_ids):]:
+                            sent = await self.send(discord_channel, author, chunk)
+                            sent_ids.append(sent.id)
+                            self.outbox.progress(key, discord_channel.id, sent_ids)
+                        self.message_index.record(topic_id, message.id, discord_channel.id, sent_ids, webhook=author is not None)
+                        self.count("forwarded")
+                    
+                        logger.info(f"Mensagem de texto enviada para o canal Discord: {discord_channel.name}")
+                    except (discord.errors.RateLimited, *TRANSIENT_ERRORS):
+                        raise
+                    except Exception as e:
+                        self.count("error")
+                        logger.error(f"Erro ao enviar texto para Discord: {e}")
+                
+                self.checkpoints.advance(topic_id, message.id)
+                
+                # from the telegram handler to the last discord call
+                metrics.observe("total", time.perf_counter() - received_at)
+
+            return self.outbox.track(key, await self.dispatcher.submit(discord_channel.id, deliver, priority=PRIORITY_HIGH))
+                
+        except Exception as e:
+            self.count("error")
+            logger.error(f"Erro ao processar mensagem: {e}")
+            if key:
+                self.outbox.fail(key, e)
+
+    async def forward_album(self, messages):
+        """
+        Encaminha as partes de um álbum juntas, no menor número possível de mensagens do Discord
+        """
+        received_at = time.perf_counter()
+        messages = sorted(messages, key=lambda m: m.id)
+        text = next((m.text for m in messages if m.text), '')
+        raw_caption = next((m.message for m in messages if m.message), '')
+        
+        # parts are filtered one by one (e.g. a video inside an album of photos), all against the album caption
+        messages = [m for m in messages if not self.filtered(m, raw_caption)]
+        if not messages:
+            return
+        message = messages[0]
+        
+        key = None
+        try:
+            key = self.outbox.begin(OUTBOX_ALBUM, messages)
+            if not key:
+                return
+            
+            sender_name = await get_sender_name(message)
+            
+            topic_id, topic_title = await self.get_topic_info(message)
+            
+            discord_channel = None
+            
+            if topic_id:
+                logger.info(f"Álbum do tópico: {topic_title} (ID: {topic_id})")
+                discord_channel = await self.get_or_create_discord_channel(topic_title, topic_id)
+            
+            # if no topic or no channel created, use the default channel
+            if not discord_channel:
+                discord_channel = self.discord_client.get_channel(self.route.discord_channel_id)
+            
+            # through a webhook the sender is the message author, otherwise a text prefix
+            author = await self.get_author(discord_channel, message, sender_name)
+            prefix = "" if author else f"{sender_name} - "
+            
+            caption = f"{prefix}{text}" if text else prefix.rstrip(" -")
+            
+            if self.coalescer:
+                await self.coalescer.flush(discord_channel.id)
+            
+            # discord ids of the batches already sent, kept in the outbox so any retry resumes from the one that failed
+            sent_ids = self.outbox.sent(key, discord_channel.id)
+            
+            async def deliver():
+                logger.info(f"Álbum com {len(messages)} mídias detectado de {sender_name}")
+                limit = upload_limit(discord_channel.guild)
+                
+                try:
+                    async with self.media_fetcher.fetch_album(messages, limit) as parts:
+                        # recompressed parts are smaller than the telegram size, so batch by what was downloaded
+                        files = [(f, file_size(f)) for m, f in parts if f]
+                        skipped = len(parts) - len(files)
+                        too_large = sum(1 for m, f in parts if not f and (media_size(m) or 0) > limit)
+                        self.count("too_large", too_large)
+                        self.count("error", skipped - too_large)
+                        
+                        content = caption
+                        if skipped:
+                            content += f"\n\n**[{skipped} ARQUIVO(S) MUITO GRANDE(S) OU COM ERRO]**"
+                        
+                        batches = batch_attachments(files, limit)
+                        if not batches and not sent_ids:
+                            sent = await self.send(discord_channel, author, content)
+                            sent_ids.append(sent.id)
+                        
+                        # only the first message carries the caption
+                        for i, batch in enumerate(batches):
+                            if i < len(sent_ids):
+                                continue
+                            sent = await self.send(discord_channel, author, content=content if i == 0 else None, files=batch)
+                            sent_ids.append(sent.id)
+                            self.outbox.progress(key, discord_channel.id, sent_ids)
+                    
+                    for m in messages:
+                        self.message_index.record(topic_id, m.id, discord_channel.id, sent_ids, media_key(m), album=True, webhook=author is not None)
+                    self.count("forwarded", len(files))
+                    logger.info(f"Álbum enviado para o canal Discord: {discord_channel.name} ({len(batches)} mensagem(ns))")
+                except (discord.errors.RateLimited, *TRANSIENT_ERRORS):
+                    raise
+                except Exception as e:
+                    self.count("error", len(messages))
+                    logger.error(f"Erro ao enviar álbum para Discord: {e}")
+                    await self.send(discord_channel, author, f"{caption}\n\n**[ERRO AO ENVIAR MÍDIA]**")
+                
+                self.checkpoints.advance(topic_id, messages[-1].id)
+                metrics.observe("total", time.perf_counter() - received_at)
+            
+            return self.outbox.track(key, await self.dispatcher.submit(discord_channel.id, deliver, priority=PRIORITY_HIGH))
+            
+        except Exception as e:
+            self.count("error", len(messages))
+            logger.error(f"Erro ao processar álbum: {e}")
+            if key:
+                self.outbox.fail(key, e)
+
+    async def handle_edit(self, message):
+        """
+        Replica uma edição do Telegram, editando no lugar quando a mensagem original é conhecida.
+        Retorna o envio enfileirado.
+        """
+        key = None
+        try:
+            if self.filtered(message):
+                return
+            
+            key = self.outbox.begin(OUTBOX_EDIT, [message])
+            if not key:
+                return
+            
+            sender_name = await get_sender_name(message)
+            
+            topic_id, topic_title = await self.get_topic_info(message)
+            
+            discord_channel = None
+            
+            if topic_id:
+                logger.info(f"Mensagem editada do tópico: {topic_title} (ID: {topic_id})")
+                discord_channel = await self.get_or_create_discord_channel(topic_title, topic_id)
+            
+            # if no topic or no channel created, use the default channel
+            if not discord_channel:
+                discord_channel = self.discord_client.get_channel(self.route.discord_channel_id)
+            
+            # through a webhook the sender is the message author, otherwise a text prefix
+            author = await self.get_author(discord_channel, message, sender_name)
+            prefix = "" if author else f"{sender_name} - "
+            
+            # the original may still be waiting in the coalescer
+            if self.coalescer:
+                await self.coalescer.flush(discord_channel.id)
+            
+            # chunks of a re-posted text edit already sent, kept in the outbox across retries
+            sent_ids = self.outbox.sent(key, discord_channel.id)
+            
+            # deliver through the channel queue so the handler never waits on discord
+            async def deliver():
+                # edit the forwarded messages in place when we know them
+                entry = self.message_index.get(topic_id, message.id)
+                if entry and entry["channel_id"] == discord_channel.id:
+                    try:
+                        if await self.edit_in_place(discord_channel, entry, message, topic_id, sender_name):
+                            self.count("edited")
+                            return
+                    except discord.errors.NotFound:
+                        logger.warning(f"Mensagem Discord original não encontrada, reenviando edição de {message.id}")
+                    except discord.errors.Forbidden:
+                        # e.g. a bot message while delivering through webhooks, or the other way around
+                        logger.warning(f"Sem permissão para editar a mensagem Discord original, reenviando edição de {message.id}")
+                
+                if message.media:
+                    logger.info(f"Mensagem editada com mídia detectada de {sender_name}")
+                
+                    caption = f"[EDITADO] {prefix}{message.text}" if message.text else f"[EDITADO] {prefix}".rstrip(" -")
+                
+                    # send to discord
+                    try:
+                        await self.send_media(discord_channel, author, message, caption)
+                        self.count("edited")
+                        logger.info(f"Mídia editada enviada para o canal Discord: {discord_channel.name}")
+                    except TRANSIENT_ERRORS:
+                        raise
+                    except MediaTooLarge:
+                        self.count("too_large")
+                        await self.send(discord_channel, author,
+                            f"{caption}\n\n**[ARQUIVO MUITO GRANDE PARA SER ENVIADO]**\n"
+                        )
+                    except discord.errors.HTTPException as e:
+                        metrics.count("discord_errors", status=e.status)
+                        if e.status == 413:
+                            self.count("too_large")
+                            await self.send(discord_channel, author,
+                                f"{caption}\n\n**[ARQUIVO MUITO GRANDE PARA SER ENVIADO]**\n"
+                            )
+                        else:
+                            self.count("error")
+                            logger.error(f"Erro HTTP ao enviar mídia editada: {e}")
+                            await self.send(discord_channel, author, f"{caption}\n\n**[ERRO AO ENVIAR MÍDIA]**")
+                    except discord.errors.RateLimited:
+                        raise
+                    except Exception as e:
+                        self.count("error")
+                        logger.error(f"Erro ao enviar mídia editada para Discord: {e}")
+                        await self.send(discord_channel, author, f"{caption}\n\n**[ERRO AO ENVIAR MÍDIA EDITADA]**")
+                else:
+                    formatted_text = f"[EDITADO] {prefix}{message.text}"
+                
+                    try:
+                        for chunk in split_message(formatted_text)[len(sent_ids):]:
+                            sent = await self.send(discord_channel, author, chunk)
+                            sent_ids.append(sent.id)
+                            self.outbox.progress(key, discord_channel.id, sent_ids)
+                        self.count("edited")
+                    
+                        logger.info(f"Mensagem de texto editada enviada para o canal Discord: {discord_channel.name}")
+                    except (discord.errors.RateLimited, *TRANSIENT_ERRORS):
+                        raise
+                    except Exception as e:
+                        self.count("error")
+                        logger.error(f"Erro ao enviar texto editado para Discord: {e}")
+
+            return self.outbox.track(key, await self.dispatcher.submit(discord_channel.id, deliver, priority=PRIORITY_LOW))
+                
+        except Exception as e:
+            self.count("error")
+            logger.error(f"Erro ao processar mensagem editada: {e}")
+            if key:
+                self.outbox.fail(key, e)
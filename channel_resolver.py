@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+def safe_channel_name(topic_title, topic_id):
+    # spaces become dashes before anything else is stripped
+    name = topic_title.lower().replace(' ', '-')
+    name = ''.join(c for c in name if c.isalnum() or c in '-_')
+    return name or f"topic-{topic_id}"
+
+
+# name -> channel index of the discord guilds, kept up to date by gateway events
+class ChannelResolver:
+    def __init__(self):
+        # index: {guild_id: {channel_name: channel}}
+        self._index = {}
+
+        # creations in flight: {(guild_id, channel_name): task}
+        self._pending = {}
+
+    def index_guild(self, guild):
+        self._index[guild.id] = {}
+        for channel in guild.text_channels:
+            self._index[guild.id].setdefault(channel.name, channel)
+        logger.info(f"Canais indexados do servidor {guild.name}: {len(self._index[guild.id])}")
+
+    def _add(self, channel):
+        if isinstance(channel, discord.TextChannel):
+            self._index.setdefault(channel.guild.id, {}).setdefault(channel.name, channel)
+
+    def _remove(self, channel):
+        # also drops the aliases indexed by _create
+        names = self._index.get(channel.guild.id, {})
+        for name in [n for n, c in names.items() if c.id == channel.id]:
+            del names[name]
+
+    def on_channel_create(self, channel):
+        self._add(channel)
+
+    def on_channel_delete(self, channel):
+        self._remove(channel)
+
+    def on_channel_update(self, before, after):
+        self._remove(before)
+        self._add(after)
+
+    def find(self, guild_id, name):
+        return self._index.get(guild_id, {}).get(name)
+
+    async def _create(self, guild, name, topic_title):
+        channel = await guild.create_text_channel(
+            name=name,
+            topic=f"Tópico importado do Telegram: {topic_title}"
+        )
+        self._add(channel)
+
+        # discord may normalise the name, so index the requested one too
+        self._index.setdefault(guild.id, {})[name] = channel
+        logger.info(f"Novo canal Discord criado: '{channel.name}' (ID: {channel.id})")
+        return channel
+
+    async def resolve(self, guild, topic_title, topic_id):
+        """
+        Obtém o canal do tópico pelo nome ou cria um novo; pedidos simultâneos para o mesmo canal
+        compartilham uma única criação
+        """
+        name = safe_channel_name(topic_title, topic_id)
+
+        if guild.id not in self._index:
+            self.index_guild(guild)
+
+        channel = self.find(guild.id, name)
+        if channel:
+            return channel
+
+        key = (guild.id, name)
+        task = self._pending.get(key)
+        if not task:
+            task = asyncio.ensure_future(self._create(guild, name, topic_title))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+        # shield so one cancelled waiter doesn't cancel the creation for everyone
+        return await asyncio.shield(task)
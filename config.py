@@ -0,0 +1,85 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# telegram Config
+API_ID = int(os.getenv('API_ID', 0))
+API_HASH = os.getenv('API_HASH', '')
+SESSION_NAME = 'user_session'
+CANAL_ORIGEM = os.getenv('CANAL_ORIGEM', '')
+TOPICOS_IGNORADOS = os.getenv('TOPICOS_IGNORADOS', '')
+FILTERS_FILE = os.getenv('FILTERS_FILE', '') # json allow/deny rules by chat, topic (0 = outside topics), sender, media type, size and text regex
+FILTERS_RELOAD_INTERVAL = float(os.getenv('FILTERS_RELOAD_INTERVAL', 5)) # seconds between checks for changes in the filters file
+TOPIC_CACHE_TTL = int(os.getenv('TOPIC_CACHE_TTL', 3600)) # seconds a topic title stays cached
+TOPIC_CACHE_MAX = int(os.getenv('TOPIC_CACHE_MAX', 5000)) # max topic titles kept in memory
+
+# discord Config
+DISCORD_TOKEN = os.getenv('DISCORD_TOKEN', '')
+DISCORD_GUILD_ID = int(os.getenv('DISCORD_GUILD_ID', 0))
+DISCORD_CHANNEL_ID = int(os.getenv('DISCORD_CHANNEL_ID', 0)) # channel id to send messages
+
+# routing config
+ROUTES_FILE = os.getenv('ROUTES_FILE', '') # json list of routes; when empty a single route is built from the vars above
+SHARD_INDEX = int(os.getenv('SHARD_INDEX', 0)) # this process handles the routes where index % SHARD_COUNT == SHARD_INDEX
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', 1))
+
+# send queue config
+DISPATCH_QUEUE_SIZE = int(os.getenv('DISPATCH_QUEUE_SIZE', 100)) # max pending sends per discord channel
+DISPATCH_CONCURRENCY = int(os.getenv('DISPATCH_CONCURRENCY', 8)) # max concurrent sends across every route and channel
+DISPATCH_OVERFLOW = os.getenv('DISPATCH_OVERFLOW', 'block') # block, shed or spill low priority sends when a queue is full
+DISPATCH_SPILL_SIZE = int(os.getenv('DISPATCH_SPILL_SIZE', 1000)) # low priority sends spilled per discord channel before new ones are shed
+DISPATCH_CHANNEL_BURST = int(os.getenv('DISPATCH_CHANNEL_BURST', 5)) # sends allowed per channel in each period (0 disables)
+DISPATCH_CHANNEL_PERIOD = float(os.getenv('DISPATCH_CHANNEL_PERIOD', 5)) # seconds of the per channel rate-limit bucket
+DISCORD_MAX_RATELIMIT_WAIT = float(os.getenv('DISCORD_MAX_RATELIMIT_WAIT', 30)) # longer 429s are handed back to the send queue
+STARTUP_BUFFER_SIZE = int(os.getenv('STARTUP_BUFFER_SIZE', 10000)) # telegram events held per route while discord connects and the backfill runs; when full new updates wait
+COALESCE_WINDOW = float(os.getenv('COALESCE_WINDOW', 0)) # seconds to merge consecutive short texts per channel (0 disables)
+DISCORD_DELIVERY = os.getenv('DISCORD_DELIVERY', 'bot') # bot, or webhook to post as the telegram sender through one webhook per channel
+WEBHOOK_AVATAR_CHANNEL_ID = int(os.getenv('WEBHOOK_AVATAR_CHANNEL_ID', 0)) # channel where sender photos are uploaded to get avatar urls (0 disables avatars)
+AVATAR_CACHE_TTL = int(os.getenv('AVATAR_CACHE_TTL', 43200)) # seconds an avatar url is reused, discord attachment urls expire
+AVATAR_CACHE_MAX = int(os.getenv('AVATAR_CACHE_MAX', 2000)) # max avatar urls kept in memory
+
+# message index config
+MESSAGE_INDEX_MAX = int(os.getenv('MESSAGE_INDEX_MAX', 50000)) # max forwarded messages remembered for edits
+MESSAGE_INDEX_RETENTION_DAYS = int(os.getenv('MESSAGE_INDEX_RETENTION_DAYS', 7)) # edits older than this are re-posted
+
+# backfill config
+BACKFILL_ENABLED = os.getenv('BACKFILL_ENABLED', 'true').lower() in ('1', 'true', 'yes') # catch up on messages posted while offline
+BACKFILL_LOG_EVERY = int(os.getenv('BACKFILL_LOG_EVERY', os.getenv('BACKFILL_BATCH_SIZE', 500))) # history messages scanned between progress log lines (telegram returns 100 per request)
+BACKFILL_CONCURRENCY = int(os.getenv('BACKFILL_CONCURRENCY', 20)) # backfilled deliveries (and their downloads) in flight
+BACKFILL_SEND_RATE = float(os.getenv('BACKFILL_SEND_RATE', 0)) # max backfilled messages per second (0 = unlimited)
+BACKFILL_MAX_GAP = int(os.getenv('BACKFILL_MAX_GAP', 20000)) # how many message ids back the catch-up may go
+
+# outbox config
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8)) # deliveries of an event before it is dropped
+OUTBOX_RETRY_BASE = float(os.getenv('OUTBOX_RETRY_BASE', 5)) # seconds before the first retry, doubled at each attempt
+OUTBOX_RETRY_MAX = float(os.getenv('OUTBOX_RETRY_MAX', 600)) # longest wait between retries
+
+# media config
+MEDIA_SPOOL_MAX_MEMORY = int(os.getenv('MEDIA_SPOOL_MAX_MEMORY', 8 * 1024 * 1024)) # files up to this size never touch the disk
+MEDIA_SPOOL_DIR = os.getenv('MEDIA_SPOOL_DIR') or None # where larger files spill to (system temp dir by default)
+MEDIA_MAX_DOWNLOADS = int(os.getenv('MEDIA_MAX_DOWNLOADS', 4)) # downloads running at once across all routes
+MEDIA_MAX_BYTES_IN_FLIGHT = int(os.getenv('MEDIA_MAX_BYTES_IN_FLIGHT', 256 * 1024 * 1024)) # memory budget of downloads waiting to be sent
+MEDIA_PARALLEL_THRESHOLD = int(os.getenv('MEDIA_PARALLEL_THRESHOLD', 10 * 1024 * 1024)) # files from this size are downloaded in parallel parts
+MEDIA_PARALLEL_PARTS = int(os.getenv('MEDIA_PARALLEL_PARTS', 4)) # parts downloaded at once for a large file
+MEDIA_CACHE_MAX = int(os.getenv('MEDIA_CACHE_MAX', 10000)) # media already on discord remembered to re-post repeats as links (0 disables)
+
+# recompression of media above the upload limit (images need Pillow, videos need ffmpeg)
+RECOMPRESS_WORKERS = int(os.getenv('RECOMPRESS_WORKERS', 0)) # encoder processes (0 disables, oversized media becomes a placeholder)
+RECOMPRESS_QUEUE_SIZE = int(os.getenv('RECOMPRESS_QUEUE_SIZE', 8)) # jobs waiting for a worker before new ones fall back to the placeholder
+RECOMPRESS_TIMEOUT = int(os.getenv('RECOMPRESS_TIMEOUT', 120)) # seconds a single job may take
+RECOMPRESS_MAX_INPUT = int(os.getenv('RECOMPRESS_MAX_INPUT', 200 * 1024 * 1024)) # larger files aren't even downloaded
+FFMPEG_PATH = os.getenv('FFMPEG_PATH', 'ffmpeg')
+FFPROBE_PATH = os.getenv('FFPROBE_PATH', 'ffprobe')
+
+# metrics config
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0)) # port of the prometheus /metrics endpoint (0 disables)
+METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
+METRICS_LOG_INTERVAL = float(os.getenv('METRICS_LOG_INTERVAL', 300)) # seconds between metrics summary log lines (0 disables)
+
+# dirs
+MAPPINGS_DIR = "./mappings"
+
+# persistence config
+STORE_BACKEND = os.getenv('STORE_BACKEND', 'sqlite')
+STORE_PATH = os.getenv('STORE_PATH', os.path.join(MAPPINGS_DIR, "bridge.db"))
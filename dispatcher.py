@@ -0,0 +1,179 @@
+import discord
+from collections import deque
+import asyncio
+import logging
+import time
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_LOW = 1
+
+# what to do with low priority work when a channel queue is full
+OVERFLOW_BLOCK = "block"
+OVERFLOW_SHED = "shed"
+OVERFLOW_SPILL = "spill"
+
+
+# per discord channel lane: one queue, one worker, one rate-limit bucket
+class _ChannelLane:
+    def __init__(self, channel_id, max_queue, burst, period):
+        self.channel_id = channel_id
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.spill = deque()
+        self.worker = None
+
+        # token bucket mirroring discord's per-channel message bucket
+        self.burst = burst
+        self.period = period
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.paused_until = 0
+
+    async def take_token(self):
+        if not self.burst:
+            return
+
+        while True:
+            now = time.monotonic()
+            if self.paused_until > now:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+
+            # refill tokens according to the elapsed time
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.burst / self.period)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self.tokens) * self.period / self.burst)
+
+    def next_item(self):
+        if not self.queue.empty():
+            return self.queue.get_nowait()
+        if self.spill:
+            return self.spill.popleft()
+        return None
+
+
+# decouples telegram handlers from discord delivery
+class SendDispatcher:
+    def __init__(self, max_queue=100, max_concurrency=8, overflow=OVERFLOW_BLOCK,
+                 channel_burst=5, channel_period=5, idle_timeout=300, semaphore=None, max_spill=1000):
+        self.max_queue = max_queue
+        self.overflow = overflow
+
+        # low priority sends held per channel beyond the queue with the spill policy; past it they are shed
+        self.max_spill = max_spill
+        self.channel_burst = channel_burst
+        self.channel_period = channel_period
+        self.idle_timeout = idle_timeout
+
+        # global cap of concurrent discord jobs; dispatchers given the same semaphore share it
+        self._semaphore = semaphore or asyncio.Semaphore(max_concurrency)
+
+        # lanes: {discord_channel_id: _ChannelLane}
+        self._lanes = {}
+
+        self.shed = 0
+        self.spilled = 0
+
+    def _get_lane(self, channel_id):
+        lane = self._lanes.get(channel_id)
+        if not lane:
+            lane = _ChannelLane(channel_id, self.max_queue, self.channel_burst, self.channel_period)
+            self._lanes[channel_id] = lane
+
+        if not lane.worker or lane.worker.done():
+            lane.worker = asyncio.create_task(self._worker(lane))
+        return lane
+
+    async def submit(self, channel_id, job, priority=PRIORITY_HIGH):
+        """
+        Enfileira um job de envio para o canal Discord, aguardando apenas se a fila estiver cheia
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        # errors are already logged by the worker
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        lane = self._get_lane(channel_id)
+        item = (job, future, time.perf_counter())
+
+        if lane.queue.full() and priority == PRIORITY_LOW:
+            if self.overflow == OVERFLOW_SPILL and len(lane.spill) < self.max_spill:
+                self.spilled += 1
+                metrics.count("dispatch_spilled")
+                lane.spill.append(item)
+                return future
+
+            if self.overflow in (OVERFLOW_SHED, OVERFLOW_SPILL):
+                self.shed += 1
+                metrics.count("dispatch_shed")
+                logger.warning(f"Fila do canal {channel_id} cheia, descartando envio de baixa prioridade")
+                future.cancel()
+                return future
+
+        # backpressure: wait for room in the channel queue
+        await lane.queue.put(item)
+
+        # the worker may have exited while we waited
+        if lane.worker.done():
+            self._lanes[channel_id] = lane
+            lane.worker = asyncio.create_task(self._worker(lane))
+        return future
+
+    async def _run(self, lane, job, future, queued_at):
+        while True:
+            await lane.take_token()
+            async with self._semaphore:
+                # time spent in the queue, the rate-limit bucket and waiting for a slot
+                metrics.observe("queue_wait", time.perf_counter() - queued_at)
+                try:
+                    with metrics.timer("deliver"):
+                        result = await job()
+                except discord.errors.RateLimited as e:
+                    # pause only this channel's bucket and rerun the job; multi-part jobs remember
+                    # what they already sent, so the rerun resumes from the part that failed
+                    metrics.count("discord_errors", status=429)
+                    queued_at = time.perf_counter()
+                    logger.warning(f"Rate limit no canal {lane.channel_id}, aguardando {e.retry_after:.1f}s")
+                    lane.paused_until = time.monotonic() + e.retry_after
+                    continue
+                except Exception as e:
+                    logger.error(f"Erro ao entregar mensagem no canal {lane.channel_id}: {e}")
+                    if not future.done():
+                        future.set_exception(e)
+                    return
+
+            if not future.done():
+                future.set_result(result)
+            return
+
+    async def _worker(self, lane):
+        while True:
+            item = lane.next_item()
+            if item is None:
+                try:
+                    item = await asyncio.wait_for(lane.queue.get(), timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if lane.queue.empty() and not lane.spill:
+                        self._lanes.pop(lane.channel_id, None)
+                        return
+                    continue
+
+            job, future, queued_at = item
+            if future.cancelled():
+                continue
+            await self._run(lane, job, future, queued_at)
+
+    def queue_depths(self):
+        return {channel_id: lane.queue.qsize() + len(lane.spill) for channel_id, lane in self._lanes.items()}
+
+    async def close(self):
+        for lane in list(self._lanes.values()):
+            if lane.worker:
+                lane.worker.cancel()
+        self._lanes.clear()
@@ -0,0 +1,158 @@
+import logging
+import json
+import time
+import os
+import re
+from media import media_size
+
+logger = logging.getLogger(__name__)
+
+ALLOW = "allow"
+DENY = "deny"
+
+# what media_type() can return, checked when the rules are compiled
+MEDIA_TYPES = ("text", "photo", "video", "gif", "audio", "voice", "sticker", "document", "webpage", "other")
+
+
+def media_type(message):
+    """
+    Classifica a mídia da mensagem usando apenas os atributos já presentes nela
+    """
+    if not message.media:
+        return "text"
+    if message.photo:
+        return "photo"
+
+    # stickers, gifs, voice notes and videos are all documents, so they are checked first
+    for kind in ("sticker", "gif", "voice", "audio", "video"):
+        if getattr(message, kind, None):
+            return kind
+    if getattr(message, 'video_note', None):
+        return "video"
+    if message.document:
+        return "document"
+    if getattr(message, 'web_preview', None):
+        return "webpage"
+    return "other"
+
+
+# one allow/deny rule; every condition present must match, a rule without conditions matches everything
+class Rule:
+    def __init__(self, action, name=None, chats=None, topics=None, senders=None, media=None,
+                 min_size=None, max_size=None, text=None):
+        if action not in (ALLOW, DENY):
+            raise ValueError(f"ação inválida: {action}")
+
+        unknown = set(media or ()) - set(MEDIA_TYPES)
+        if unknown:
+            raise ValueError(f"tipos de mídia desconhecidos: {sorted(unknown)}")
+
+        self.action = action
+        self.name = name
+        self.chats = {int(c) for c in chats} if chats else None
+        self.topics = {int(t) for t in topics} if topics else None
+        self.senders = {int(s) for s in senders} if senders else None
+        self.media = set(media) if media else None
+        self.min_size = min_size
+        self.max_size = max_size
+        self.text = re.compile(text) if text else None
+
+    @classmethod
+    def from_dict(cls, data, index):
+        data = dict(data)
+        return cls(data.pop("action"), name=data.pop("name", f"#{index}"), **data)
+
+    def matches(self, chat_id, topic_id, sender_id, kind, size, text):
+        if self.chats is not None and chat_id not in self.chats:
+            return False
+        if self.topics is not None and (topic_id or 0) not in self.topics:
+            return False
+        if self.senders is not None and sender_id not in self.senders:
+            return False
+        if self.media is not None and kind not in self.media:
+            return False
+
+        # size conditions only apply to messages with a file
+        if self.min_size is not None and (size is None or size < self.min_size):
+            return False
+        if self.max_size is not None and (size is None or size > self.max_size):
+            return False
+
+        if self.text is not None and not self.text.search(text or ""):
+            return False
+        return True
+
+    def __repr__(self):
+        return f"Rule({self.action} {self.name})"
+
+
+def compile_rules(data):
+    """
+    Compila as regras do arquivo de filtros: {"default": "allow", "rules": [{"action": "deny", ...}]}
+    """
+    default = data.get("default", ALLOW)
+    if default not in (ALLOW, DENY):
+        raise ValueError(f"ação padrão inválida: {default}")
+    return [Rule.from_dict(rule, i) for i, rule in enumerate(data.get("rules", []))], default
+
+
+# allow/deny rules evaluated on the raw telegram message, before any api call; the file is reloaded when it changes
+class MessageFilter:
+    def __init__(self, path=None, reload_interval=5):
+        self.path = path
+        self.reload_interval = reload_interval
+
+        self.rules = []
+        self.default = ALLOW
+
+        self._mtime = None
+        self._checked_at = 0
+
+    def load(self):
+        """
+        Lê o arquivo de filtros; erros na primeira leitura são propagados
+        """
+        if not self.path:
+            return
+
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, 'r') as f:
+            self.rules, self.default = compile_rules(json.load(f))
+        self._mtime = mtime
+        logger.info(f"Filtros carregados: {len(self.rules)} regras, padrão {self.default}")
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if not self.path or now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime == self._mtime:
+                return
+
+            # a broken file is reported once per change, not on every check
+            self._mtime = mtime
+            self.load()
+        except Exception as e:
+            # a broken edit keeps the rules that were working
+            logger.error(f"Erro ao recarregar filtros, mantendo as regras anteriores: {e}")
+
+    def match(self, message, chat_id, topic_id, route_rules=(), text=None):
+        """
+        Retorna a regra que decide a mensagem (None quando vale o padrão) e se ela é permitida
+        """
+        self._maybe_reload()
+
+        sender_id = message.sender_id
+        kind = media_type(message)
+        size = media_size(message)
+        if text is None:
+            text = message.message
+
+        # the route's own rules (e.g. its ignored topics) come before the shared ones
+        for rule in (*route_rules, *self.rules):
+            if rule.matches(chat_id, topic_id, sender_id, kind, size, text):
+                return rule, rule.action == ALLOW
+        return None, self.default == ALLOW
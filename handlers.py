@@ -0,0 +1,126 @@
+from telethon import events, types
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# routes telegram updates to the bridge of their source channel
+class TelegramHandlers:
+    def __init__(self, bridges, buffer_size=10000):
+        self.bridges = bridges
+        self.bridges_by_chat = {bridge.chat_id: bridge for bridge in bridges}
+        self.bridges_by_origem = {bridge.origem_id: bridge for bridge in bridges}
+
+        # events received before each route is released, in arrival order: {chat_id: Queue[(handler, event)]}
+        self._buffers = {bridge.chat_id: asyncio.Queue(maxsize=buffer_size) for bridge in bridges}
+        self._released = set()
+        self._registered = False
+
+    def released(self, bridge):
+        return bridge.chat_id in self._released
+
+    async def _dispatch(self, bridge, handler, event):
+        if not bridge:
+            return None
+        if bridge.chat_id in self._released:
+            return await handler(event)
+
+        # when the buffer is full telethon's update tasks wait here, nothing is dropped
+        await self._buffers[bridge.chat_id].put((handler, event))
+        return None
+
+    def _service_bridge(self, update):
+        message = update.message
+        if isinstance(message, types.MessageService):
+            return self.bridges_by_origem.get(getattr(message.peer_id, 'channel_id', None))
+        return None
+
+    async def _service_message(self, update):
+        bridge = self._service_bridge(update)
+        if bridge:
+            bridge.handle_service_message(update.message)
+
+    async def _new_message(self, event):
+        bridge = self.bridges_by_chat.get(event.chat_id)
+        if bridge:
+            return await bridge.forward_message(event.message)
+
+    async def _album(self, event):
+        bridge = self.bridges_by_chat.get(event.chat_id)
+        if bridge:
+            return await bridge.forward_album(event.messages)
+
+    async def _edit(self, event):
+        bridge = self.bridges_by_chat.get(event.chat_id)
+        if bridge:
+            return await bridge.handle_edit(event.message)
+
+    async def on_service_message(self, update):
+        return await self._dispatch(self._service_bridge(update), self._service_message, update)
+
+    # the handlers return the queued delivery, telethon ignores it but the benchmark awaits it
+    async def on_new_message(self, event):
+        # album parts are forwarded together by on_album
+        if event.message.grouped_id:
+            return None
+        return await self._dispatch(self.bridges_by_chat.get(event.chat_id), self._new_message, event)
+
+    async def on_album(self, event):
+        return await self._dispatch(self.bridges_by_chat.get(event.chat_id), self._album, event)
+
+    async def on_edit(self, event):
+        return await self._dispatch(self.bridges_by_chat.get(event.chat_id), self._edit, event)
+
+    def register(self, client):
+        """
+        Registra os handlers no cliente Telegram; chamadas repetidas não registram de novo
+        """
+        if self._registered:
+            return
+        self._registered = True
+
+        chats = [bridge.entity for bridge in self.bridges]
+
+        client.add_event_handler(self.on_service_message, events.Raw(types=[types.UpdateNewChannelMessage]))
+        client.add_event_handler(self.on_new_message, events.NewMessage(chats=chats))
+        client.add_event_handler(self.on_album, events.Album(chats=chats))
+        client.add_event_handler(self.on_edit, events.MessageEdited(chats=chats))
+
+        logger.info(f"Monitorando mensagens de {len(self.bridges)} canal(is) Telegram...")
+        logger.info("Pressione Ctrl+C para parar")
+
+    async def release(self, bridge=None):
+        """
+        Processa, em ordem, os eventos da rota recebidos antes de ela ser liberada (todas as rotas se
+        bridge for None) e passa a entregar direto. Mensagens já encaminhadas pelo backfill são ignoradas.
+        """
+        if bridge is None:
+            for bridge in self.bridges:
+                await self.release(bridge)
+            return
+
+        buffer = self._buffers[bridge.chat_id]
+        processed = 0
+        while True:
+            while not buffer.empty():
+                handler, event = buffer.get_nowait()
+                try:
+                    # the backfill ran before this and already covered messages that arrived meanwhile
+                    messages = getattr(event, 'messages', None) or [getattr(event, 'message', None)]
+                    if handler in (self._new_message, self._album) and bridge.forwarded(messages[0]):
+                        continue
+                    await handler(event)
+                except Exception as e:
+                    logger.error(f"Erro ao processar evento recebido durante a inicialização: {e}")
+                finally:
+                    processed += 1
+
+            # let handlers waiting on a full buffer put their event before switching over
+            await asyncio.sleep(0)
+            if buffer.empty():
+                break
+
+        self._released.add(bridge.chat_id)
+        if processed:
+            logger.info(f"{processed} evento(s) recebido(s) durante a inicialização processado(s) para {bridge.origem_id}")
@@ -1,455 +1,309 @@
-from telethon import TelegramClient, events, functions, types
-from telethon.tl.types import InputChannel, Channel, InputPeerChannel
-from telethon.errors import ChatAdminRequiredError, ChatForbiddenError
+from telethon import TelegramClient
 import asyncio
+import signal
+import time
 import os
 import logging
-import json
-from dotenv import load_dotenv
 import discord
 from discord.ext import commands
+import config
+from routes import load_routes
+from bridge import RouteBridge
+from handlers import TelegramHandlers
+from media import MediaFetcher
+from channel_resolver import ChannelResolver
+from storage import open_store, migrate_json_files
+from metrics import metrics
+from webhooks import WebhookRegistry, AvatarCache
+from media_cache import MediaCache
+from recompress import Recompressor
+from filters import MessageFilter
 
-os.makedirs("./downloads", exist_ok=True)
-
-# configs
-logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+# nothing runs on import, so the bridge pieces can be reused by tools such as the benchmark
 
-# telegram Config
-API_ID = int(os.getenv('API_ID', 0))
-API_HASH = os.getenv('API_HASH', '')
-SESSION_NAME = 'user_session'
-CANAL_ORIGEM_STR = os.getenv('CANAL_ORIGEM', '')
-TOPICOS_IGNORADOS_STR = os.getenv('TOPICOS_IGNORADOS', '')
+def load_configured_routes():
+    """
+    Carrega as rotas da configuração, encerrando o processo se estiverem incompletas
+    """
+    try:
+        routes = load_routes(
+            config.ROUTES_FILE,
+            config.CANAL_ORIGEM,
+            config.DISCORD_GUILD_ID,
+            config.DISCORD_CHANNEL_ID,
+            config.TOPICOS_IGNORADOS,
+            shard_index=config.SHARD_INDEX,
+            shard_count=config.SHARD_COUNT
+        )
+    except Exception as e:
+        logger.error(f"Erro ao carregar rotas: {e}")
+        exit(1)
 
-# discord Config
-DISCORD_TOKEN = os.getenv('DISCORD_TOKEN', '')
-DISCORD_GUILD_ID = int(os.getenv('DISCORD_GUILD_ID', 0))
-DISCORD_CHANNEL_ID = int(os.getenv('DISCORD_CHANNEL_ID', 0)) # channel id to send messages
+    if not config.API_ID or not config.API_HASH or not config.DISCORD_TOKEN or not all(r.canal_origem and r.discord_channel_id for r in routes):
+        logger.error("Por favor, configure as variáveis de ambiente API_ID, API_HASH, DISCORD_TOKEN e CANAL_ORIGEM/DISCORD_CHANNEL_ID (ou ROUTES_FILE)")
+        exit(1)
 
-# dirs
-MAPPINGS_DIR = "./mappings"
-os.makedirs(MAPPINGS_DIR, exist_ok=True)
+    return routes
 
-TOPICOS_IGNORADOS = []
-if TOPICOS_IGNORADOS_STR:
+def load_message_filter():
+    """
+    Carrega os filtros de mensagens, encerrando o processo se o arquivo for inválido
+    """
+    message_filter = MessageFilter(config.FILTERS_FILE or None, reload_interval=config.FILTERS_RELOAD_INTERVAL)
     try:
-        # check if is csv
-        if "," in TOPICOS_IGNORADOS_STR:
-            for id_str in TOPICOS_IGNORADOS_STR.split(","):
-                if id_str.strip().strip('"').strip("'"):
-                    TOPICOS_IGNORADOS.append(int(id_str.strip().strip('"').strip("'")))
-        else:
-            # try with unique value
-            if TOPICOS_IGNORADOS_STR.strip('"').strip("'"):
-                TOPICOS_IGNORADOS.append(int(TOPICOS_IGNORADOS_STR.strip('"').strip("'")))
+        message_filter.load()
     except Exception as e:
-        logger.error(f"Erro ao processar TOPICOS_IGNORADOS: {e}")
-        TOPICOS_IGNORADOS = []
+        logger.error(f"Erro ao carregar filtros: {e}")
+        exit(1)
+    return message_filter
+
+def build_clients():
+    # each shard needs its own telegram session file
+    session_name = config.SESSION_NAME if config.SHARD_COUNT == 1 else f"{config.SESSION_NAME}_shard{config.SHARD_INDEX}"
+    telegram_client = TelegramClient(session_name, config.API_ID, config.API_HASH)
 
-try:
-    CANAL_ORIGEM = int(CANAL_ORIGEM_STR.strip('"').strip("'")) if CANAL_ORIGEM_STR and CANAL_ORIGEM_STR.strip('"').strip("'").startswith('-') else CANAL_ORIGEM_STR.strip('"').strip("'")
-except ValueError as e:
-    logger.error(f"Erro ao converter canal: {e}")
-    exit(1)
+    # config discord with intents
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.guilds = True
+    discord_client = commands.Bot(command_prefix="!", intents=intents, max_ratelimit_timeout=config.DISCORD_MAX_RATELIMIT_WAIT)
 
-if not API_ID or not API_HASH or not CANAL_ORIGEM or not DISCORD_TOKEN or not DISCORD_CHANNEL_ID:
-    logger.error("Por favor, configure as variáveis de ambiente API_ID, API_HASH, CANAL_ORIGEM, DISCORD_TOKEN e DISCORD_CHANNEL_ID")
-    exit(1)
+    return telegram_client, discord_client
 
-telegram_client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
+def build_recompressor():
+    if not config.RECOMPRESS_WORKERS:
+        return None
+    return Recompressor(
+        workers=config.RECOMPRESS_WORKERS,
+        max_queue=config.RECOMPRESS_QUEUE_SIZE,
+        timeout=config.RECOMPRESS_TIMEOUT,
+        max_input=config.RECOMPRESS_MAX_INPUT,
+        ffmpeg=config.FFMPEG_PATH,
+        ffprobe=config.FFPROBE_PATH,
+        tmp_dir=config.MEDIA_SPOOL_DIR
+    )
 
-# config discord with intents
-intents = discord.Intents.default()
-intents.message_content = True
-intents.guilds = True
-discord_client = commands.Bot(command_prefix="!", intents=intents)
+def build_media_fetcher(telegram_client, recompressor=None):
+    # media downloads for every route go through one fetcher and one memory budget
+    return MediaFetcher(
+        telegram_client,
+        max_downloads=config.MEDIA_MAX_DOWNLOADS,
+        max_bytes_in_flight=config.MEDIA_MAX_BYTES_IN_FLIGHT,
+        spool_max_memory=config.MEDIA_SPOOL_MAX_MEMORY,
+        spool_dir=config.MEDIA_SPOOL_DIR,
+        parallel_threshold=config.MEDIA_PARALLEL_THRESHOLD,
+        parallel_parts=config.MEDIA_PARALLEL_PARTS,
+        recompressor=recompressor
+    )
 
-# mapper of telegram topics to discord channels
-class TopicMapper:
-    def __init__(self, origem_id):
-        self.origem_id = str(origem_id)
-        
-        # map of topics: {id_topico_origem: id_canal_discord}
-        self.topic_mapping = {}
-        
-        # name of the file to store the mapping
-        self.mapping_file = os.path.join(MAPPINGS_DIR, f"topic_mapping_{self.origem_id}_discord.json")
-        
-        # load if exists
-        self._load_mapping()
+def register_metrics(bridges, media_fetcher, media_cache=None):
+    # current queue depths and download state, read whenever metrics are exported
+    metrics.register_gauge("dispatch_queue_depth", lambda: {b.origem_id: sum(b.dispatcher.queue_depths().values()) for b in bridges}, label="route")
+    metrics.register_gauge("outbox_pending", lambda: {b.origem_id: len(b.outbox) for b in bridges}, label="route")
+    metrics.register_gauge("topic_cache_size", lambda: {b.origem_id: b.topic_registry.stats()["size"] for b in bridges}, label="route")
+    metrics.register_gauge("topic_cache_hits", lambda: {b.origem_id: b.topic_registry.stats()["hits"] for b in bridges}, label="route")
+    metrics.register_gauge("topic_cache_misses", lambda: {b.origem_id: b.topic_registry.stats()["misses"] for b in bridges}, label="route")
+    metrics.register_gauge("media_downloads_active", lambda: media_fetcher.stats()["active"])
+    metrics.register_gauge("media_bytes_in_flight", lambda: media_fetcher.stats()["bytes_in_flight"])
+    metrics.register_gauge("media_download_bytes_received", lambda: sum(p["received"] for p in media_fetcher.progress()))
+    metrics.register_gauge("media_download_bytes_per_second", lambda: sum(p["bytes_per_second"] for p in media_fetcher.progress()))
+    if media_cache:
+        metrics.register_gauge("media_cache_size", lambda: media_cache.stats()["size"])
+        metrics.register_gauge("media_cache_bytes_saved", lambda: media_cache.stats()["bytes_saved"])
+    if media_fetcher.recompressor:
+        metrics.register_gauge("media_recompress_pending", lambda: media_fetcher.recompressor.stats()["pending"])
+
+async def main():
+    started_at = time.monotonic()
+    routes = load_configured_routes()
+    message_filter = load_message_filter()
+    os.makedirs(config.MAPPINGS_DIR, exist_ok=True)
     
-    def _load_mapping(self):
-        if os.path.exists(self.mapping_file):
-            try:
-                with open(self.mapping_file, 'r') as f:
-                    data = json.load(f)
-                    # string to int conversion
-                    self.topic_mapping = {int(k): int(v) for k, v in data.items()}
-                logger.info(f"Mapeamento de tópicos carregado: {len(self.topic_mapping)} tópicos")
-            except Exception as e:
-                logger.error(f"Erro ao carregar mapeamento de tópicos: {e}")
-                self.topic_mapping = {}
+    telegram_client, discord_client = build_clients()
+    media_fetcher = build_media_fetcher(telegram_client, build_recompressor())
     
-    def _save_mapping(self):
-        try:
-            with open(self.mapping_file, 'w') as f:
-                # stringify to serialize
-                json_data = {str(k): str(v) for k, v in self.topic_mapping.items()}
-                json.dump(json_data, f)
-            logger.info(f"Mapeamento de tópicos salvo: {len(self.topic_mapping)} tópicos")
-        except Exception as e:
-            logger.error(f"Erro ao salvar mapeamento de tópicos: {e}")
+    # topic channel lookups for every guild
+    channel_resolver = ChannelResolver()
     
-    def get_discord_channel_id(self, origem_topic_id):
-        return self.topic_mapping.get(origem_topic_id)
+    # open the persistence layer, importing the old json files on first run
+    store = open_store(config.STORE_BACKEND, config.STORE_PATH)
+    await store.open()
+    await migrate_json_files(store, config.MAPPINGS_DIR)
     
-    def add_topic_mapping(self, origem_topic_id, discord_channel_id):
-        self.topic_mapping[origem_topic_id] = discord_channel_id
-        self._save_mapping()
-        logger.info(f"Novo mapeamento de tópico adicionado: {origem_topic_id} -> {discord_channel_id}")
-
-async def main():
-    # init telegram client
-    await telegram_client.start()
+    # discord urls of media already sent, shared by every route
+    media_cache = None
+    if config.MEDIA_CACHE_MAX:
+        media_cache = MediaCache(store, max_entries=config.MEDIA_CACHE_MAX)
+    
+    # one webhook per discord channel when delivering as the telegram senders
+    webhooks = None
+    if config.DISCORD_DELIVERY == 'webhook':
+        avatars = AvatarCache(
+            telegram_client,
+            discord_client,
+            config.WEBHOOK_AVATAR_CHANNEL_ID,
+            ttl=config.AVATAR_CACHE_TTL,
+            max_size=config.AVATAR_CACHE_MAX
+        )
+        webhooks = WebhookRegistry(discord_client, store, avatars)
+    
+    # log in to both clients while the shared caches load
+    login_started_at = time.monotonic()
+    try:
+        await asyncio.gather(
+            telegram_client.start(),
+            discord_client.login(config.DISCORD_TOKEN),
+            media_cache.load() if media_cache else asyncio.sleep(0),
+            webhooks.load() if webhooks else asyncio.sleep(0)
+        )
+    except Exception as e:
+        logger.error(f"Erro ao conectar os clientes: {e}")
+        await telegram_client.disconnect()
+        await discord_client.close()
+        await store.close()
+        exit(1)
     logger.info("Cliente Telegram conectado com sucesso!")
     
-    # init client discord
+    # assigned once the routes are resolved; on_ready may fire before that
+    bridges = []
+    started = False
+    
+    # init client discord; the gateway connects in the background
     discord_client.remove_command('help')
+    discord_task = asyncio.create_task(discord_client.connect())
+    login_seconds = time.monotonic() - login_started_at
     
     @discord_client.event
     async def on_ready():
         logger.info(f'Discord Bot conectado como {discord_client.user}')
         logger.info(f'ID do Bot: {discord_client.user.id}')
-        
-        # check channels and permissions
-        guild = discord_client.get_guild(DISCORD_GUILD_ID)
-        if not guild:
-            logger.error(f"Não foi possível encontrar o servidor Discord com ID {DISCORD_GUILD_ID}")
-            return
-            
-        channel = guild.get_channel(DISCORD_CHANNEL_ID)
-        if not channel:
-            logger.error(f"Não foi possível encontrar o canal Discord com ID {DISCORD_CHANNEL_ID}")
-            return
-            
-        logger.info(f"Servidor Discord: {guild.name} (ID: {guild.id})")
-        logger.info(f"Canal Discord principal: {channel.name} (ID: {channel.id})")
-        
-        # start telegram handlers
-        await setup_telegram_handlers()
     
-    # start discord client as background task
-    asyncio.create_task(discord_client.start(DISCORD_TOKEN))
+        # after a reconnect the guild caches are rebuilt, so index them again; handlers stay as they are
+        if started:
+            for bridge in bridges:
+                bridge.check_discord()
+    
+    # keep the channel index in sync with the guilds
+    @discord_client.event
+    async def on_guild_channel_create(channel):
+        channel_resolver.on_channel_create(channel)
+    
+    @discord_client.event
+    async def on_guild_channel_delete(channel):
+        channel_resolver.on_channel_delete(channel)
+    
+    @discord_client.event
+    async def on_guild_channel_update(before, after):
+        channel_resolver.on_channel_update(before, after)
     
     # config log
-    logger.info(f"CANAL_ORIGEM: {CANAL_ORIGEM}")
-    logger.info(f"TÓPICOS IGNORADOS: {TOPICOS_IGNORADOS}")
-
-    # origen channel entity
-    try:
-        canal_origem_entity = await telegram_client.get_entity(CANAL_ORIGEM)
-        origem_id = canal_origem_entity.id
-        
-        logger.info(f"Canal de origem: {getattr(canal_origem_entity, 'title', CANAL_ORIGEM)} (ID: {origem_id})")
-        
-        # instance of the topic mapper
-        topic_mapper = TopicMapper(origem_id)
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter canal origem: {e}")
-        await telegram_client.disconnect()
-        exit(1)
-
-    async def get_or_create_discord_channel(topic_title, telegram_topic_id):
-        """
-        Obtém ou cria um canal no Discord com o mesmo título do tópico do Telegram
-        """
-        discord_channel_id = topic_mapper.get_discord_channel_id(telegram_topic_id)
-        if discord_channel_id:
-            # check if exists
-            channel = discord_client.get_channel(discord_channel_id)
-            if channel:
-                return channel
-        
+    logger.info(f"ROTAS: {routes}")
+    
+    # discord sends running at once, across every route
+    send_slots = asyncio.Semaphore(config.DISPATCH_CONCURRENCY)
+    
+    # one bridge per source channel, all sharing both clients; source entities are resolved in parallel
+    async def resolve(route):
+        bridge = RouteBridge(route, telegram_client, discord_client, store, media_fetcher, channel_resolver, webhooks, media_cache, message_filter, send_slots)
         try:
-            guild = discord_client.get_guild(DISCORD_GUILD_ID)
-            if not guild:
-                logger.error("Servidor Discord não encontrado")
-                return None
-            
-            # create a new channel with the same name as the topic
-            safe_name = ''.join(c for c in topic_title.lower() if c.isalnum() or c in '-_').replace(' ', '-')
-            if not safe_name:
-                safe_name = f"topic-{telegram_topic_id}"
-                
-            # check if channel already exists
-            existing_channel = discord.utils.get(guild.text_channels, name=safe_name)
-            if existing_channel:
-                topic_mapper.add_topic_mapping(telegram_topic_id, existing_channel.id)
-                return existing_channel
-            
-            # create a new channel
-            new_channel = await guild.create_text_channel(
-                name=safe_name,
-                topic=f"Tópico importado do Telegram: {topic_title}"
-            )
-            
-            topic_mapper.add_topic_mapping(telegram_topic_id, new_channel.id)
-            logger.info(f"Novo canal Discord criado: '{new_channel.name}' (ID: {new_channel.id})")
-            return new_channel
-            
-        except discord.errors.Forbidden:
-            logger.error("Erro ao criar canal: Permissões insuficientes no Discord")
-            return None
+            await bridge.resolve()
+            return bridge
         except Exception as e:
-            logger.error(f"Erro ao criar canal Discord para tópico '{topic_title}': {e}")
-            return None
-
-    async def get_topic_info(message):
-        topic_id = None
-        
-        if hasattr(message, 'reply_to') and message.reply_to:
-            if hasattr(message.reply_to, 'reply_to_top_id') and message.reply_to.reply_to_top_id:
-                topic_id = message.reply_to.reply_to_top_id
-            elif hasattr(message.reply_to, 'forum_topic') and message.reply_to.forum_topic:
-                if not isinstance(message.reply_to.forum_topic, bool) and hasattr(message.reply_to.forum_topic, 'id'):
-                    topic_id = message.reply_to.forum_topic.id
-        
-        if not topic_id and hasattr(message, 'forum_topic') and message.forum_topic:
-            if not isinstance(message.forum_topic, bool) and hasattr(message.forum_topic, 'id'):
-                topic_id = message.forum_topic.id
-        
-        if not topic_id:
-            return None, None
-        
+            logger.error(f"Erro ao obter canal origem {route.canal_origem}: {e}")
+    
+    bridges = [b for b in await asyncio.gather(*(resolve(route) for route in routes)) if b]
+    
+    if not bridges:
+        discord_task.cancel()
+        await telegram_client.disconnect()
+        await discord_client.close()
+        await store.close()
+        exit(1)
+    
+    # routes telegram updates to the bridges; registered once, buffering each route until it is released
+    handlers = TelegramHandlers(bridges, buffer_size=config.STARTUP_BUFFER_SIZE)
+    handlers.register(telegram_client)
+    
+    # topics, message index, checkpoints and outbox of every route at once
+    warm_started_at = time.monotonic()
+    await asyncio.gather(*(bridge.load() for bridge in bridges))
+    warm_seconds = time.monotonic() - warm_started_at
+    
+    register_metrics(bridges, media_fetcher, media_cache)
+    
+    metrics_runner = None
+    if config.METRICS_PORT:
         try:
-            # try to obtain the topics from the channel
-            forum_topics = await telegram_client.get_messages(
-                canal_origem_entity,
-                ids=types.InputMessageID(topic_id)
-            )
-            
-            if forum_topics:
-                return topic_id, getattr(forum_topics[0], 'topic', {}).get('title', f"Tópico {topic_id}")
-            else:
-                return topic_id, f"Tópico {topic_id}"
-            
+            metrics_runner = await metrics.serve(config.METRICS_HOST, config.METRICS_PORT)
         except Exception as e:
-            logger.warning(f"Não foi possível obter título do tópico {topic_id}: {e}")
-            try:
-                # second method to obtain the topic title
-                forum_topics = await telegram_client(functions.channels.GetForumTopicsRequest(
-                    channel=canal_origem_entity,
-                    offset_date=0,
-                    offset_id=0,
-                    offset_topic=0,
-                    limit=100,
-                    q=""
-                ))
-                
-                for topic in forum_topics.topics:
-                    if topic.id == topic_id:
-                        return topic_id, topic.title
-                
-                return topic_id, f"Tópico {topic_id}"
-            except Exception as e2:
-                logger.warning(f"Segunda tentativa falhou: {e2}")
-                return topic_id, f"Tópico {topic_id}"
-
-    async def setup_telegram_handlers():
-        # telegram handlers
-        @telegram_client.on(events.NewMessage(chats=canal_origem_entity))
-        async def on_new_message(event):
-            message = event.message
-            
-            try:
-                topic_id = None
-                if hasattr(message, 'reply_to') and message.reply_to:
-                    if hasattr(message.reply_to, 'reply_to_top_id') and message.reply_to.reply_to_top_id:
-                        topic_id = message.reply_to.reply_to_top_id
-                        if topic_id in TOPICOS_IGNORADOS:
-                            logger.info(f"Mensagem do tópico ignorado: {topic_id}")
-                            return
-                
-                sender = await event.get_sender()
-                sender_name = getattr(sender, 'first_name', '') or getattr(sender, 'title', '')
-                if hasattr(sender, 'last_name') and sender.last_name:
-                    sender_name += f" {sender.last_name}"
-                
-                if not sender_name:
-                    sender_name = getattr(sender, 'username', '') or f"ID:{sender.id}"
-                
-                prefix = f"{sender_name} - "
-                
-                topic_id, topic_title = await get_topic_info(message)
-                
-                discord_channel = None
-                
-                if topic_id:
-                    logger.info(f"Mensagem do tópico: {topic_title} (ID: {topic_id})")
-                    discord_channel = await get_or_create_discord_channel(topic_title, topic_id)
-                
-                # if no topic or no channel created, use the default channel
-                if not discord_channel:
-                    discord_channel = discord_client.get_channel(DISCORD_CHANNEL_ID)
-                
-                # if has media, download and send
-                if message.media:
-                    logger.info(f"Mensagem com mídia detectada de {sender_name}")
-                    
-                    path = await message.download_media("./downloads/")
-                    
-                    caption = f"{prefix}{message.text}" if message.text else prefix.rstrip(" -")
-                    
-                    # send to discord
-                    try:
-                        # create discord file
-                        discord_file = discord.File(path)
-                        
-                        # send message with file
-                        await discord_channel.send(content=caption, file=discord_file)
-                        logger.info(f"Mídia enviada para o canal Discord: {discord_channel.name}")
-                        
-                    except discord.errors.HTTPException as e:
-                        # if file is too large
-                        if e.status == 413: 
-                            await discord_channel.send(
-                                f"{caption}\n\n**[ARQUIVO MUITO GRANDE PARA SER ENVIADO]**\n"
-                            )
-                            logger.warning(f"Arquivo muito grande para enviar ao Discord: {path}")
-                        else:
-                            logger.error(f"Erro HTTP ao enviar mídia: {e}")
-                            await discord_channel.send(f"{caption}\n\n**[ERRO AO ENVIAR MÍDIA]**")
-                    except Exception as e:
-                        logger.error(f"Erro ao enviar mídia para Discord: {e}")
-                        await discord_channel.send(f"{caption}\n\n**[ERRO AO ENVIAR MÍDIA]**")
-                    
-                    # clean up the downloaded file
-                    try:
-                        os.remove(path)
-                    except:
-                        pass
-                else:
-                    formatted_text = f"{prefix}{message.text}"
-                    
-                    # send to discord
-                    try:
-                        # break the text into chunks if too long
-                        if len(formatted_text) > 2000:
-                            chunks = [formatted_text[i:i+1999] for i in range(0, len(formatted_text), 1999)]
-                            for i, chunk in enumerate(chunks):
-                                if i == 0:
-                                    await discord_channel.send(chunk)
-                                else:
-                                    await discord_channel.send(f"(Continuação) {chunk}")
-                        else:
-                            await discord_channel.send(formatted_text)
-                        
-                        logger.info(f"Mensagem de texto enviada para o canal Discord: {discord_channel.name}")
-                    except Exception as e:
-                        logger.error(f"Erro ao enviar texto para Discord: {e}")
-                    
-            except Exception as e:
-                logger.error(f"Erro ao processar mensagem: {e}")
-
-        @telegram_client.on(events.MessageEdited(chats=canal_origem_entity))
-        async def on_edit(event):
-            message = event.message
-            
+            logger.error(f"Erro ao iniciar o endpoint de métricas: {e}")
+    if config.METRICS_LOG_INTERVAL:
+        asyncio.create_task(metrics.log_periodically(config.METRICS_LOG_INTERVAL))
+    
+    # a failed gateway connection ends the wait instead of hanging on the ready event
+    ready_task = asyncio.create_task(discord_client.wait_until_ready())
+    await asyncio.wait([ready_task, discord_task], return_when=asyncio.FIRST_COMPLETED)
+    if not ready_task.done():
+        ready_task.cancel()
+        logger.error(f"Erro ao conectar ao Discord: {discord_task.exception() if not discord_task.cancelled() else 'cancelado'}")
+        for bridge in bridges:
+            await bridge.close()
+        await telegram_client.disconnect()
+        await discord_client.close()
+        await store.close()
+        exit(1)
+    
+    for bridge in bridges:
+        bridge.check_discord()
+    started = True
+    
+    # deliver what was pending when the process stopped, and retry transient failures from now on
+    for bridge in bridges:
+        bridge.start_outbox()
+    
+    # each route forwards what was posted while the bridge was down before its live events, so
+    # older messages reach every discord channel first; live events of a route wait in its buffer meanwhile
+    async def catch_up(bridge):
+        if config.BACKFILL_ENABLED:
             try:
-                topic_id = None
-                if hasattr(message, 'reply_to') and message.reply_to:
-                    if hasattr(message.reply_to, 'reply_to_top_id') and message.reply_to.reply_to_top_id:
-                        topic_id = message.reply_to.reply_to_top_id
-                        if topic_id in TOPICOS_IGNORADOS:
-                            logger.info(f"Mensagem do tópico ignorado: {topic_id}")
-                            return
-                
-                sender = await event.get_sender()
-                sender_name = getattr(sender, 'first_name', '') or getattr(sender, 'title', '')
-                if hasattr(sender, 'last_name') and sender.last_name:
-                    sender_name += f" {sender.last_name}"
-                
-                if not sender_name:
-                    sender_name = getattr(sender, 'username', '') or f"ID:{sender.id}"
-                
-                prefix = f"{sender_name} - "
-                
-                topic_id, topic_title = await get_topic_info(message)
-                
-                discord_channel = None
-                
-                if topic_id:
-                    logger.info(f"Mensagem editada do tópico: {topic_title} (ID: {topic_id})")
-                    discord_channel = await get_or_create_discord_channel(topic_title, topic_id)
-                
-                # if no topic or no channel created, use the default channel
-                if not discord_channel:
-                    discord_channel = discord_client.get_channel(DISCORD_CHANNEL_ID)
-                
-                if message.media:
-                    logger.info(f"Mensagem editada com mídia detectada de {sender_name}")
-                    
-                    path = await message.download_media("./downloads/")
-                    
-                    caption = f"[EDITADO] {prefix}{message.text}" if message.text else f"[EDITADO] {prefix}".rstrip(" -")
-                    
-                    # send to discord
-                    try:
-                        discord_file = discord.File(path)
-                        await discord_channel.send(content=caption, file=discord_file)
-                        logger.info(f"Mídia editada enviada para o canal Discord: {discord_channel.name}")
-                    except discord.errors.HTTPException as e:
-                        if e.status == 413:
-                            await discord_channel.send(
-                                f"{caption}\n\n**[ARQUIVO MUITO GRANDE PARA SER ENVIADO]**\n"
-                            )
-                        else:
-                            logger.error(f"Erro HTTP ao enviar mídia editada: {e}")
-                            await discord_channel.send(f"{caption}\n\n**[ERRO AO ENVIAR MÍDIA]**")
-                    except Exception as e:
-                        logger.error(f"Erro ao enviar mídia editada para Discord: {e}")
-                        await discord_channel.send(f"{caption}\n\n**[ERRO AO ENVIAR MÍDIA EDITADA]**")
-                    
-                    try:
-                        os.remove(path)
-                    except:
-                        pass
-                else:
-                    formatted_text = f"[EDITADO] {prefix}{message.text}"
-                    
-                    try:
-                        if len(formatted_text) > 2000:
-                            chunks = [formatted_text[i:i+1999] for i in range(0, len(formatted_text), 1999)]
-                            for i, chunk in enumerate(chunks):
-                                if i == 0:
-                                    await discord_channel.send(chunk)
-                                else:
-                                    await discord_channel.send(f"(Continuação) {chunk}")
-                        else:
-                            await discord_channel.send(formatted_text)
-                        
-                        logger.info(f"Mensagem de texto editada enviada para o canal Discord: {discord_channel.name}")
-                    except Exception as e:
-                        logger.error(f"Erro ao enviar texto editado para Discord: {e}")
-                    
+                await bridge.backfill()
             except Exception as e:
-                logger.error(f"Erro ao processar mensagem editada: {e}")
-
-        logger.info(f"Monitorando mensagens do canal Telegram {CANAL_ORIGEM}...")
-        logger.info("Pressione Ctrl+C para parar")
-
+                logger.error(f"Erro no backfill de {bridge.origem_id}: {e}")
+        await handlers.release(bridge)
+    
+    for bridge in bridges:
+        asyncio.create_task(catch_up(bridge))
+    
+    time_to_ready = time.monotonic() - started_at
+    metrics.register_gauge("time_to_ready_seconds", lambda: time_to_ready)
+    logger.info(f"Pronto em {time_to_ready:.1f}s (login {login_seconds:.1f}s, caches {warm_seconds:.1f}s)")
+    
+    # a deploy's SIGTERM shuts down like Ctrl+C, so pending writes are flushed
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(telegram_client.disconnect()))
+    except NotImplementedError:
+        pass
+    
     try:
         await telegram_client.run_until_disconnected()
     except KeyboardInterrupt:
         logger.info("Programa interrompido pelo usuário")
     finally:
+        for bridge in bridges:
+            await bridge.close()
+        await store.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        if media_fetcher.recompressor:
+            media_fetcher.recompressor.shutdown()
         await telegram_client.disconnect()
         await discord_client.close()
+        discord_task.cancel()
         logger.info("Clientes desconectados")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    # configs
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    asyncio.run(main())
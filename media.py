@@ -0,0 +1,282 @@
+from contextlib import asynccontextmanager, AsyncExitStack
+import tempfile
+import asyncio
+import time
+import logging
+import os
+import discord
+from metrics import metrics
+from recompress import RecompressFailed
+
+logger = logging.getLogger(__name__)
+
+# discord's upload limit for guilds without boosts
+DEFAULT_UPLOAD_LIMIT = 10 * 1024 * 1024
+
+# max attachments discord accepts in a single message
+MAX_ATTACHMENTS = 10
+
+
+class MediaTooLarge(Exception):
+    def __init__(self, size, limit):
+        super().__init__(f"arquivo de {size} bytes excede o limite de {limit} bytes")
+        self.size = size
+        self.limit = limit
+
+
+def upload_limit(guild):
+    return guild.filesize_limit if guild else DEFAULT_UPLOAD_LIMIT
+
+
+def media_size(message):
+    return getattr(message.file, 'size', None) if message.file else None
+
+
+def file_size(discord_file):
+    fp = discord_file.fp
+    fp.seek(0, 2)
+    size = fp.tell()
+    fp.seek(0)
+    return size
+
+
+def media_filename(message):
+    name = getattr(message.file, 'name', None) if message.file else None
+    if name:
+        return name
+
+    ext = (getattr(message.file, 'ext', None) if message.file else None) or ''
+    return f"{message.id}{ext}"
+
+
+# limits how many bytes the downloads in progress may hold at once
+class ByteBudget:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, n):
+        async with self._condition:
+            # a single item bigger than the budget still runs, but alone
+            await self._condition.wait_for(lambda: self.used == 0 or self.used + n <= self.max_bytes)
+            self.used += n
+
+    async def release(self, n):
+        async with self._condition:
+            self.used -= n
+            self._condition.notify_all()
+
+
+# progress of one download, exposed through MediaFetcher.progress()
+class DownloadProgress:
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.received = 0
+        self.started_at = time.monotonic()
+
+    def as_dict(self):
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        return {
+            "name": self.name,
+            "size": self.size,
+            "received": self.received,
+            "bytes_per_second": self.received / elapsed,
+        }
+
+
+# downloads telegram media into spooled temp files, splitting large files into parallel parts
+class MediaFetcher:
+    def __init__(self, client, max_downloads=4, max_bytes_in_flight=256 * 1024 * 1024,
+                 spool_max_memory=8 * 1024 * 1024, spool_dir=None,
+                 parallel_threshold=10 * 1024 * 1024, parallel_parts=4, request_size=512 * 1024,
+                 recompressor=None):
+        self.client = client
+        self.spool_max_memory = spool_max_memory
+        self.spool_dir = spool_dir
+        self.parallel_threshold = parallel_threshold
+        self.parallel_parts = parallel_parts
+        self.request_size = request_size
+
+        # optional, shrinks images and videos above the upload limit instead of dropping them
+        self.recompressor = recompressor
+
+        self._semaphore = asyncio.Semaphore(max_downloads)
+        self._budget = ByteBudget(max_bytes_in_flight)
+
+        # downloads in progress: {id: DownloadProgress}
+        self._active = {}
+        self._next_id = 0
+
+        self.bytes_downloaded = 0
+        self.downloads_completed = 0
+
+    async def _download_parallel(self, document, spool, progress):
+        chunks = -(-document.size // self.request_size)
+        chunks_per_part = -(-chunks // self.parallel_parts)
+
+        async def download_part(first_chunk):
+            position = first_chunk * self.request_size
+            async for chunk in self.client.iter_download(
+                document,
+                offset=position,
+                limit=chunks_per_part,
+                request_size=self.request_size,
+                file_size=document.size
+            ):
+                # seek + write never yields, so parts can share the spool
+                spool.seek(position)
+                spool.write(chunk)
+                position += len(chunk)
+                progress.received += len(chunk)
+
+        await asyncio.gather(*(download_part(c) for c in range(0, chunks, chunks_per_part)))
+        spool.seek(0, 2)
+
+    async def _download(self, message, spool, progress):
+        document = message.document
+        if document and document.size >= self.parallel_threshold and self.parallel_parts > 1:
+            await self._download_parallel(document, spool, progress)
+            return True
+
+        def on_progress(received, total):
+            progress.received = received
+
+        return await message.download_media(file=spool, progress_callback=on_progress)
+
+    def _footprint(self, message):
+        size = media_size(message)
+        return min(size or self.spool_max_memory, self.spool_max_memory)
+
+    @asynccontextmanager
+    async def fetch(self, message, limit, reserve=True):
+        """
+        Baixa a mídia para um arquivo em memória (ou em disco se passar de spool_max_memory)
+        e entrega um discord.File pronto para envio. Mídias acima do limite são recomprimidas
+        quando possível. O arquivo temporário é sempre removido.
+        """
+        size = media_size(message)
+
+        # check the size before spending bandwidth on the download
+        shrink = False
+        if size and size > limit:
+            if not (self.recompressor and self.recompressor.accepts(message, size)):
+                raise MediaTooLarge(size, limit)
+            shrink = True
+
+        # the spool only keeps up to spool_max_memory in memory
+        reserved = self._footprint(message) if reserve else 0
+        await self._budget.acquire(reserved)
+
+        download_id = self._next_id
+        self._next_id += 1
+        progress = DownloadProgress(media_filename(message), size)
+
+        # the encoder workers read the original by path, so it goes straight to disk
+        if shrink:
+            spool = tempfile.NamedTemporaryFile(dir=self.spool_dir, suffix=os.path.splitext(media_filename(message))[1])
+        else:
+            spool = tempfile.SpooledTemporaryFile(max_size=self.spool_max_memory, dir=self.spool_dir)
+        try:
+            async with self._semaphore:
+                # throughput counts from the first byte requested, not from the wait for a slot
+                progress.started_at = time.monotonic()
+                self._active[download_id] = progress
+                try:
+                    with metrics.timer("download"):
+                        result = await self._download(message, spool, progress)
+                finally:
+                    self._active.pop(download_id, None)
+
+            if result is None:
+                raise ValueError("mídia não pode ser baixada")
+
+            # size may be unknown before the download (e.g. web previews)
+            downloaded = spool.tell()
+            self.bytes_downloaded += downloaded
+            self.downloads_completed += 1
+            logger.debug(f"Mídia baixada: {progress.name} ({downloaded} bytes, {progress.as_dict()['bytes_per_second'] / 1024:.0f} KB/s)")
+            metrics.count("media_bytes_downloaded", downloaded)
+            if downloaded > limit and not shrink:
+                raise MediaTooLarge(downloaded, limit)
+
+            if downloaded > limit:
+                spool.flush()
+                async with AsyncExitStack() as stack:
+                    try:
+                        fp, ext = await stack.enter_async_context(self.recompressor.shrink(message, spool.name, limit))
+                    except RecompressFailed as e:
+                        logger.warning(f"Não foi possível recomprimir {progress.name}: {e}")
+                        raise MediaTooLarge(downloaded, limit) from e
+
+                    filename = os.path.splitext(media_filename(message))[0] + ext
+                    logger.info(f"Mídia recomprimida: {progress.name} ({downloaded} -> {os.fstat(fp.fileno()).st_size} bytes)")
+                    yield discord.File(fp, filename=filename)
+                return
+
+            spool.seek(0)
+            yield discord.File(spool, filename=media_filename(message))
+        finally:
+            spool.close()
+            await self._budget.release(reserved)
+
+    @asynccontextmanager
+    async def fetch_album(self, messages, limit):
+        """
+        Baixa as partes de um álbum em paralelo. Entrega uma lista de (mensagem, discord.File ou None),
+        na ordem do álbum, com None para as partes grandes demais ou que falharam.
+        """
+        # reserve the whole album at once, so albums never wait on each other holding half a budget
+        reserved = sum(self._footprint(m) for m in messages)
+        await self._budget.acquire(reserved)
+        stack = AsyncExitStack()
+        stack.push_async_callback(self._budget.release, reserved)
+
+        async with stack:
+            async def enter(message):
+                try:
+                    return await stack.enter_async_context(self.fetch(message, limit, reserve=False))
+                except MediaTooLarge as e:
+                    logger.warning(f"Parte do álbum muito grande para enviar ao Discord: {e}")
+                except Exception as e:
+                    logger.error(f"Erro ao baixar parte do álbum {message.id}: {e}")
+                return None
+
+            files = await asyncio.gather(*(enter(m) for m in messages))
+            yield list(zip(messages, files))
+
+    def progress(self):
+        """
+        Progresso e vazão de cada download em andamento (exportados somados como gauges)
+        """
+        return [p.as_dict() for p in self._active.values()]
+
+    def stats(self):
+        return {
+            "active": len(self._active),
+            "bytes_in_flight": self._budget.used,
+            "bytes_downloaded": self.bytes_downloaded,
+            "downloads_completed": self.downloads_completed,
+        }
+
+
+def batch_attachments(items, limit, max_count=MAX_ATTACHMENTS):
+    """
+    Agrupa itens (item, tamanho) em lotes de até max_count itens e limit bytes somados
+    """
+    batches = []
+    current = []
+    total = 0
+
+    for item, size in items:
+        if current and (len(current) >= max_count or total + size > limit):
+            batches.append(current)
+            current = []
+            total = 0
+        current.append(item)
+        total += size
+
+    if current:
+        batches.append(current)
+    return batches
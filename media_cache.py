@@ -0,0 +1,94 @@
+from collections import OrderedDict
+import hashlib
+import asyncio
+import logging
+import time
+import discord
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _hash_file(fp):
+    digest = hashlib.sha256()
+    fp.seek(0)
+    for chunk in iter(lambda: fp.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    fp.seek(0)
+    return f"sha256:{digest.hexdigest()}"
+
+
+async def content_hash(fp):
+    # hashing a large file would stall both clients, so it runs in a thread
+    return await asyncio.get_running_loop().run_in_executor(None, _hash_file, fp)
+
+
+def media_embed(entry):
+    """
+    Embed que reapresenta uma mídia já enviada: imagens aparecem inline, outros arquivos como link.
+    Ao contrário de um link no texto, o embed sobrevive às edições da legenda.
+    """
+    if entry["image"]:
+        return discord.Embed().set_image(url=entry["url"])
+    return discord.Embed(title=entry["filename"], url=entry["url"])
+
+
+# discord urls of media already uploaded, so repeats are posted without a new download or upload
+class MediaCache:
+    def __init__(self, store, max_entries=10000):
+        self.store = store
+        self.max_entries = max_entries
+
+        # entries in lru order: {key: {"url", "filename", "size", "image", "used_at"}}
+        # key is the telegram media key (photo:<id>, document:<id>) or the content hash
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    async def load(self):
+        try:
+            for key, entry in await self.store.load_media_cache(self.max_entries):
+                self._entries[key] = entry
+            logger.info(f"Cache de mídias carregado: {len(self._entries)} arquivos")
+        except Exception as e:
+            logger.error(f"Erro ao carregar cache de mídias: {e}")
+            self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if not entry:
+            self.misses += 1
+            metrics.count("media_cache", result="miss")
+            return None
+
+        self.hits += 1
+        self.bytes_saved += entry["size"] or 0
+        metrics.count("media_cache", result="hit")
+        self._entries.move_to_end(key)
+
+        # persisted so the lru order survives restarts; the store batches the writes
+        entry["used_at"] = time.time()
+        self.store.put_media_cache(key, entry)
+        return entry
+
+    def put(self, key, url, filename, size, image):
+        entry = {"url": url, "filename": filename, "size": size, "image": image, "used_at": time.time()}
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        self.store.put_media_cache(key, entry)
+
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self.store.delete_media_cache(evicted)
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes_saved": self.bytes_saved,
+        }
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def media_key(message):
+    """
+    Identifica o arquivo de mídia da mensagem (foto/documento) para detectar troca de arquivo numa edição
+    """
+    media = getattr(message, 'media', None)
+    if not media:
+        return None
+
+    photo = getattr(media, 'photo', None)
+    if photo is not None and getattr(photo, 'id', None):
+        return f"photo:{photo.id}"
+
+    document = getattr(media, 'document', None)
+    if document is not None and getattr(document, 'id', None):
+        return f"document:{document.id}"
+
+    return None
+
+
+# index of forwarded messages: (topic, telegram message id) -> discord message ids
+class MessageIndex:
+    def __init__(self, store, origem_id, max_entries=50000, retention_days=7):
+        self.store = store
+        self.origem_id = str(origem_id)
+        self.max_entries = max_entries
+        self.retention = retention_days * 86400
+
+        # entries: {(topic_id, message_id): {"channel_id", "message_ids", "media_key", "album", "coalesced", "webhook", "created_at"}}
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _key(topic_id, message_id):
+        return (topic_id or 0, message_id)
+
+    async def load(self):
+        try:
+            for topic_id, message_id, entry in await self.store.load_messages(self.origem_id):
+                self._entries[(topic_id, message_id)] = entry
+            self._prune()
+            logger.info(f"Índice de mensagens carregado: {len(self._entries)} mensagens")
+        except Exception as e:
+            logger.error(f"Erro ao carregar índice de mensagens: {e}")
+            self._entries = OrderedDict()
+
+    def _prune(self):
+        # entries are kept in insertion order, so the oldest are first
+        cutoff = time.time() - self.retention
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and entry["created_at"] >= cutoff:
+                break
+            self._entries.popitem(last=False)
+            self.store.delete_message(self.origem_id, *key)
+
+    def get(self, topic_id, message_id):
+        return self._entries.get(self._key(topic_id, message_id))
+
+    def record(self, topic_id, message_id, channel_id, message_ids, media=None, album=False, coalesced=False, webhook=False):
+        key = self._key(topic_id, message_id)
+        entry = self._entries.pop(key, None) or {"created_at": time.time()}
+        entry.update({
+            "channel_id": channel_id,
+            "message_ids": list(message_ids),
+            "media_key": media,
+            "album": album,
+            "coalesced": coalesced,
+            "webhook": webhook,
+        })
+        self._entries[key] = entry
+        self.store.put_message(self.origem_id, *key, entry)
+        self._prune()
@@ -0,0 +1,173 @@
+from contextlib import contextmanager
+import asyncio
+import bisect
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# upper bounds, in seconds, of the timing histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+# cumulative histogram in the prometheus layout
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # the last slot counts everything above the last bucket (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # upper bound of the bucket holding the quantile, good enough for a log line
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+# timings, counters and gauges of the forwarding pipeline
+class Metrics:
+    def __init__(self):
+        # histograms: {stage: Histogram}
+        self._histograms = {}
+
+        # counters: {(name, ((label, value), ...)): int}
+        self._counters = {}
+
+        # gauges read when rendered: {name: callback returning a number or {label_value: number}}
+        self._gauges = {}
+        self._gauge_labels = {}
+
+        self.started_at = time.monotonic()
+
+    def observe(self, stage, seconds):
+        histogram = self._histograms.get(stage)
+        if not histogram:
+            histogram = self._histograms[stage] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        # also times awaits inside the block, failures included
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def count(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + n
+
+    def register_gauge(self, name, callback, label=None):
+        self._gauges[name] = callback
+        self._gauge_labels[name] = label
+
+    def _read_gauges(self):
+        for name, callback in self._gauges.items():
+            try:
+                value = callback()
+            except Exception as e:
+                logger.debug(f"Erro ao ler métrica {name}: {e}")
+                continue
+
+            if isinstance(value, dict):
+                for label_value, v in value.items():
+                    yield name, ((self._gauge_labels[name] or "key", label_value),), v
+            else:
+                yield name, (), value
+
+    def render(self):
+        """
+        Exporta as métricas no formato texto do Prometheus
+        """
+        lines = []
+
+        lines.append("# TYPE bridge_stage_seconds histogram")
+        for stage, histogram in sorted(self._histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'bridge_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'bridge_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'bridge_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'bridge_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        typed = set()
+        for (name, labels), value in sorted(self._counters.items()):
+            if name not in typed:
+                lines.append(f"# TYPE bridge_{name}_total counter")
+                typed.add(name)
+            lines.append(f"bridge_{name}_total{_format_labels(labels)} {value}")
+
+        typed = set()
+        for name, labels, value in self._read_gauges():
+            if name not in typed:
+                lines.append(f"# TYPE bridge_{name} gauge")
+                typed.add(name)
+            lines.append(f"bridge_{name}{_format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        Resumo de uma linha com contadores, p50/p99 por etapa e gauges
+        """
+        counters = " ".join(
+            f"{name}{_format_labels(labels)}={value}" for (name, labels), value in sorted(self._counters.items())
+        )
+        stages = " ".join(
+            f"{stage}[n={h.count} p50={h.quantile(0.5)}s p99={h.quantile(0.99)}s]"
+            for stage, h in sorted(self._histograms.items())
+        )
+        gauges = " ".join(
+            f"{name}{_format_labels(labels)}={value}" for name, labels, value in self._read_gauges()
+        )
+        return f"{counters} | {stages} | {gauges}"
+
+    async def log_periodically(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(f"Métricas: {self.summary()}")
+
+    async def serve(self, host, port):
+        """
+        Expõe /metrics num servidor HTTP; retorna o runner para ser encerrado no fim
+        """
+        # aiohttp already comes with discord.py
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Métricas disponíveis em http://{host}:{port}/metrics")
+        return runner
+
+
+# shared by every route and component of the process
+metrics = Metrics()
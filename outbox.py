@@ -0,0 +1,208 @@
+from telethon import errors
+import asyncio
+import logging
+import aiohttp
+import time
+import discord
+from metrics import metrics
+from webhooks import WebhookGone
+
+logger = logging.getLogger(__name__)
+
+# failures worth retrying later; anything else is logged and the event is dropped
+TRANSIENT_ERRORS = (
+    discord.errors.DiscordServerError,
+    errors.ServerError,
+    errors.FloodWaitError,
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+    ConnectionError,
+    WebhookGone,
+)
+
+OUTBOX_MESSAGE = "message"
+OUTBOX_ALBUM = "album"
+OUTBOX_EDIT = "edit"
+
+
+def outbox_key(chat_id, message):
+    # the edit date makes every edit its own event, while a replayed original keeps its key
+    edit_date = int(message.edit_date.timestamp()) if message.edit_date else 0
+    return f"{chat_id}:{message.id}:{edit_date}"
+
+
+# telegram events recorded before processing and removed once discord has them, replayed after a crash
+class Outbox:
+    def __init__(self, store, origem_id, chat_id, max_attempts=8, retry_base=5, retry_max=600):
+        self.store = store
+        self.origem_id = str(origem_id)
+        self.chat_id = chat_id
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+        # pending events, oldest first: {key: {"kind", "message_ids", "attempts", "next_at", "created_at", "sent", "in_flight"}}
+        # where "sent" is {"channel_id", "message_ids"}: the discord messages already posted for a multi-part event
+        self._entries = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    async def load(self):
+        try:
+            self._entries = await self.store.load_outbox(self.origem_id)
+        except Exception as e:
+            logger.error(f"Erro ao carregar outbox: {e}")
+            self._entries = {}
+
+        # whatever was pending when the process stopped is due right away
+        for entry in self._entries.values():
+            entry["next_at"] = 0
+            entry["in_flight"] = False
+        logger.info(f"Outbox carregado: {len(self._entries)} eventos pendentes")
+
+    def _save(self, key, entry):
+        # the store batches writes into one transaction, so a burst of events costs one commit
+        self.store.put_outbox(self.origem_id, key, entry)
+
+    def begin(self, kind, messages):
+        """
+        Registra o evento antes do processamento e devolve sua chave, ou None se o mesmo evento
+        já está sendo processado (ex.: recebido ao vivo e pelo backfill)
+        """
+        key = outbox_key(self.chat_id, messages[0])
+        entry = self._entries.get(key)
+        if entry and entry["in_flight"]:
+            return None
+
+        if not entry:
+            entry = {"kind": kind, "message_ids": [m.id for m in messages], "attempts": 0, "next_at": 0, "created_at": time.time(), "sent": None}
+            self._entries[key] = entry
+            self._save(key, entry)
+
+        entry["in_flight"] = True
+        return key
+
+    def sent(self, key, channel_id):
+        """
+        Mensagens do Discord já postadas para o evento numa tentativa anterior, para a entrega
+        retomar da parte que falhou em vez de repetir as que já foram
+        """
+        entry = self._entries.get(key)
+        sent = entry and entry.get("sent")
+        if not sent or sent["channel_id"] != channel_id:
+            return []
+        return list(sent["message_ids"])
+
+    def progress(self, key, channel_id, message_ids):
+        # saved after every part, so a crash or a transient error in the middle doesn't repost the earlier parts
+        entry = self._entries.get(key)
+        if entry:
+            entry["sent"] = {"channel_id": channel_id, "message_ids": list(message_ids)}
+            self._save(key, entry)
+
+    def ack(self, key):
+        if self._entries.pop(key, None):
+            self.store.delete_outbox(self.origem_id, key)
+
+    def retry(self, key, error):
+        entry = self._entries.get(key)
+        if not entry:
+            return
+
+        entry["attempts"] += 1
+        if entry["attempts"] >= self.max_attempts:
+            logger.error(f"Evento {key} descartado após {entry['attempts']} tentativas: {error}")
+            metrics.count("outbox", result="dropped")
+            self.ack(key)
+            return
+
+        delay = min(self.retry_base * 2 ** (entry["attempts"] - 1), self.retry_max)
+        entry["next_at"] = time.time() + delay
+        entry["in_flight"] = False
+        self._save(key, entry)
+        metrics.count("outbox", result="retried")
+        logger.warning(f"Falha temporária no evento {key}, nova tentativa em {delay:.0f}s: {error}")
+        self._wakeup.set()
+
+    def fail(self, key, error):
+        if isinstance(error, TRANSIENT_ERRORS):
+            self.retry(key, error)
+        else:
+            self.ack(key)
+
+    def track(self, key, future):
+        """
+        Confirma o evento quando a entrega termina, ou agenda nova tentativa se ela falhou por um erro temporário
+        """
+        def done(f):
+            if f.cancelled():
+                # dropped on purpose, e.g. shed by a full queue
+                self.ack(key)
+            elif f.exception():
+                self.fail(key, f.exception())
+            else:
+                self.ack(key)
+
+        if future is None:
+            self.ack(key)
+        else:
+            future.add_done_callback(done)
+        return future
+
+    def pending_ids(self, done=None):
+        """
+        Primeiro id de cada mensagem ou álbum ainda não entregue, menos o evento da mensagem done
+        (edições não contam: a mensagem original já foi tratada)
+        """
+        return [
+            min(entry["message_ids"]) for entry in self._entries.values()
+            if entry["kind"] != OUTBOX_EDIT and done not in entry["message_ids"]
+        ]
+
+    def _due(self):
+        now = time.time()
+        return [(key, entry) for key, entry in self._entries.items() if not entry["in_flight"] and entry["next_at"] <= now]
+
+    async def _run(self, replay):
+        while True:
+            for key, entry in self._due():
+                if self._entries.get(key) is not entry or entry["in_flight"]:
+                    continue
+
+                attempts = entry["attempts"]
+                try:
+                    await replay(key, entry)
+                except Exception as e:
+                    self.fail(key, e)
+                    continue
+
+                # the handler didn't take the event (e.g. the message is gone or was already forwarded)
+                if self._entries.get(key) is entry and not entry["in_flight"] and entry["attempts"] == attempts:
+                    self.ack(key)
+                else:
+                    metrics.count("outbox", result="replayed")
+
+            pending = [e["next_at"] for e in self._entries.values() if not e["in_flight"]]
+            timeout = max(0, min(pending) - time.time()) if pending else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, replay):
+        """
+        Inicia a reentrega dos eventos pendentes; chamadas repetidas não criam outra tarefa
+        """
+        if self._task and not self._task.done():
+            return
+        if self._entries:
+            logger.info(f"Reenviando {len(self._entries)} eventos pendentes do outbox")
+        self._task = asyncio.create_task(self._run(replay))
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,220 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+import multiprocessing
+import subprocess
+import tempfile
+import asyncio
+import logging
+import shutil
+import time
+import json
+import os
+from metrics import metrics
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# encoded output is kept this far below the limit, discord counts the multipart overhead too
+SIZE_MARGIN = 0.95
+
+# image re-encoding: qualities tried before downscaling, and the smallest side worth sending
+IMAGE_QUALITIES = (85, 70, 55, 40)
+MIN_IMAGE_SIDE = 320
+
+# video transcoding: audio bitrate, the lowest video bitrate worth sending and the max height
+AUDIO_BITRATE = 64_000
+MIN_VIDEO_BITRATE = 150_000
+MAX_VIDEO_HEIGHT = 720
+
+IMAGE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/bmp")
+
+
+class RecompressFailed(Exception):
+    pass
+
+
+# the functions below run in the worker processes and only touch files by path
+
+def _shrink_image(src, dst, limit, deadline):
+    target = limit * SIZE_MARGIN
+    with Image.open(src) as image:
+        image = image.convert("RGB")
+        while True:
+            for quality in IMAGE_QUALITIES:
+                image.save(dst, "JPEG", quality=quality, optimize=True)
+                if os.path.getsize(dst) <= target:
+                    return
+                if time.monotonic() > deadline:
+                    raise RecompressFailed("tempo esgotado")
+
+            # jpeg size grows roughly with the pixel count
+            scale = max(0.5, min(0.9, (target / os.path.getsize(dst)) ** 0.5))
+            width, height = int(image.width * scale), int(image.height * scale)
+            if min(width, height) < MIN_IMAGE_SIDE:
+                raise RecompressFailed("imagem não cabe no limite sem perder legibilidade")
+            image = image.resize((width, height), Image.LANCZOS)
+
+
+def _probe_duration(ffprobe, src, timeout):
+    result = subprocess.run(
+        [ffprobe, "-v", "error", "-show_entries", "format=duration", "-of", "json", src],
+        capture_output=True, timeout=timeout, check=True
+    )
+    return float(json.loads(result.stdout)["format"]["duration"])
+
+
+def _transcode_video(ffmpeg, ffprobe, src, dst, limit, duration, deadline):
+    if not duration:
+        duration = _probe_duration(ffprobe, src, max(1, deadline - time.monotonic()))
+
+    # a single pass at an average bitrate that fits the limit, retried lower if the encoder overshoots
+    budget = limit * SIZE_MARGIN * 8 / duration
+    for factor in (1.0, 0.8):
+        video_bitrate = int((budget - AUDIO_BITRATE) * factor)
+        if video_bitrate < MIN_VIDEO_BITRATE:
+            raise RecompressFailed(f"vídeo de {duration:.0f}s não cabe no limite com qualidade aceitável")
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise RecompressFailed("tempo esgotado")
+
+        try:
+            subprocess.run(
+                [
+                    ffmpeg, "-y", "-v", "error", "-i", src,
+                    "-vf", f"scale=-2:'min({MAX_VIDEO_HEIGHT},ih)'",
+                    "-c:v", "libx264", "-preset", "veryfast",
+                    "-b:v", str(video_bitrate), "-maxrate", str(video_bitrate), "-bufsize", str(video_bitrate * 2),
+                    "-c:a", "aac", "-b:a", str(AUDIO_BITRATE),
+                    "-movflags", "+faststart", dst
+                ],
+                capture_output=True, timeout=remaining, check=True
+            )
+        except subprocess.TimeoutExpired:
+            raise RecompressFailed("tempo esgotado")
+        except subprocess.CalledProcessError as e:
+            raise RecompressFailed(f"ffmpeg falhou: {e.stderr.decode(errors='replace').strip()[-200:]}")
+
+        if os.path.getsize(dst) <= limit:
+            return
+    raise RecompressFailed("vídeo continua acima do limite")
+
+
+def media_kind(message):
+    """
+    Retorna "image", "video" ou None conforme o tipo de mídia que pode ser recomprimido
+    """
+    if message.photo:
+        return "image"
+    mime_type = getattr(message.file, 'mime_type', None) if message.file else None
+    if mime_type in IMAGE_TYPES:
+        return "image"
+    if mime_type and mime_type.startswith("video/"):
+        return "video"
+    return None
+
+
+# shrinks media above the upload limit in a process pool, so encoding never blocks the event loop
+class Recompressor:
+    def __init__(self, workers=2, max_queue=8, timeout=120, max_input=200 * 1024 * 1024,
+                 ffmpeg="ffmpeg", ffprobe="ffprobe", tmp_dir=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_input = max_input
+        self.tmp_dir = tmp_dir
+
+        self.ffmpeg = shutil.which(ffmpeg)
+        self.ffprobe = shutil.which(ffprobe)
+        self.kinds = set()
+        if Image:
+            self.kinds.add("image")
+        if self.ffmpeg:
+            self.kinds.add("video")
+        if not self.kinds:
+            logger.warning("Recompressão de mídias indisponível: instale Pillow (imagens) e/ou ffmpeg (vídeos)")
+
+        # created on first use; spawn keeps the telethon and discord threads out of the workers
+        self._executor = None
+        self._slots = asyncio.Semaphore(workers)
+
+        # jobs running or waiting for a worker
+        self._pending = 0
+
+    def accepts(self, message, size):
+        """
+        Diz se vale a pena baixar uma mídia acima do limite para tentar recomprimi-la
+        """
+        return (
+            media_kind(message) in self.kinds
+            and size <= self.max_input
+            and self._pending < self.workers + self.max_queue
+        )
+
+    def _job(self, kind, message, src, dst, limit, deadline):
+        if kind == "image":
+            return _shrink_image, (src, dst, limit, deadline)
+        duration = getattr(message.file, 'duration', None) if message.file else None
+        return _transcode_video, (self.ffmpeg, self.ffprobe or "ffprobe", src, dst, limit, duration, deadline)
+
+    @asynccontextmanager
+    async def shrink(self, message, src, limit):
+        """
+        Recomprime o arquivo em src até caber em limit. Entrega (arquivo aberto, extensão);
+        levanta RecompressFailed se a fila estiver cheia, o tempo acabar ou não couber.
+        """
+        kind = media_kind(message)
+        if kind not in self.kinds:
+            raise RecompressFailed("tipo de mídia não suportado")
+
+        # beyond the queue depth it's cheaper to post the placeholder than to wait
+        if self._pending >= self.workers + self.max_queue:
+            metrics.count("media_recompressed", result="rejected")
+            raise RecompressFailed("fila de recompressão cheia")
+
+        ext = ".jpg" if kind == "image" else ".mp4"
+        fd, dst = tempfile.mkstemp(suffix=ext, dir=self.tmp_dir)
+        os.close(fd)
+
+        self._pending += 1
+        try:
+            try:
+                async with self._slots:
+                    if not self._executor:
+                        self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+                    # the budget starts when a worker picks the job; workers stop by themselves at the deadline,
+                    # waiting a bit longer only covers the round trip
+                    deadline = time.monotonic() + self.timeout
+                    function, args = self._job(kind, message, src, dst, limit, deadline)
+                    loop = asyncio.get_running_loop()
+                    with metrics.timer("recompress"):
+                        await asyncio.wait_for(loop.run_in_executor(self._executor, function, *args), self.timeout + 5)
+            except asyncio.TimeoutError:
+                metrics.count("media_recompressed", result="failed")
+                raise RecompressFailed("tempo esgotado")
+            except RecompressFailed:
+                metrics.count("media_recompressed", result="failed")
+                raise
+            except Exception as e:
+                metrics.count("media_recompressed", result="failed")
+                raise RecompressFailed(str(e)) from e
+            finally:
+                self._pending -= 1
+
+            metrics.count("media_recompressed", result="ok")
+            with open(dst, "rb") as fp:
+                yield fp, ext
+        finally:
+            os.unlink(dst)
+
+    def stats(self):
+        return {"pending": self._pending}
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
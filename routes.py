@@ -0,0 +1,66 @@
+import logging
+import json
+
+logger = logging.getLogger(__name__)
+
+
+def parse_topic_ids(value):
+    """
+    Converte uma lista de IDs de tópicos (lista JSON ou string separada por vírgulas) em inteiros
+    """
+    if isinstance(value, list):
+        return [int(v) for v in value]
+
+    topic_ids = []
+    if value:
+        try:
+            for id_str in value.split(","):
+                if id_str.strip().strip('"').strip("'"):
+                    topic_ids.append(int(id_str.strip().strip('"').strip("'")))
+        except Exception as e:
+            logger.error(f"Erro ao processar tópicos ignorados: {e}")
+            topic_ids = []
+    return topic_ids
+
+
+def parse_channel(value):
+    # numeric ids start with '-', anything else is a username or link
+    value = str(value).strip('"').strip("'")
+    return int(value) if value.startswith('-') else value
+
+
+# one telegram source channel mirrored to one discord guild
+class Route:
+    def __init__(self, canal_origem, discord_guild_id, discord_channel_id, topicos_ignorados=None):
+        self.canal_origem = canal_origem
+        self.discord_guild_id = discord_guild_id
+        self.discord_channel_id = discord_channel_id
+        self.topicos_ignorados = topicos_ignorados or []
+
+    def __repr__(self):
+        return f"Route({self.canal_origem} -> {self.discord_guild_id}/{self.discord_channel_id})"
+
+
+def load_routes(routes_file, canal_origem, discord_guild_id, discord_channel_id, topicos_ignorados,
+                shard_index=0, shard_count=1):
+    """
+    Lê as rotas do arquivo de configuração (lista JSON) ou, sem arquivo, monta uma rota única
+    a partir das variáveis de ambiente. Com shard_count > 1, devolve apenas as rotas deste shard.
+    """
+    if routes_file:
+        with open(routes_file, 'r') as f:
+            data = json.load(f)
+
+        routes = [
+            Route(
+                parse_channel(item["canal_origem"]),
+                int(item["discord_guild_id"]),
+                int(item["discord_channel_id"]),
+                parse_topic_ids(item.get("topicos_ignorados", []))
+            )
+            for item in data
+        ]
+    else:
+        routes = [Route(parse_channel(canal_origem), discord_guild_id, discord_channel_id, parse_topic_ids(topicos_ignorados))]
+
+    return [route for i, route in enumerate(routes) if i % shard_count == shard_index]
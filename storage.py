@@ -0,0 +1,387 @@
+from concurrent.futures import ThreadPoolExecutor
+from abc import ABC, abstractmethod
+import sqlite3
+import asyncio
+import logging
+import json
+import glob
+import os
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS topic_mappings (
+    origem_id TEXT NOT NULL,
+    topic_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    PRIMARY KEY (origem_id, topic_id)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    origem_id TEXT NOT NULL,
+    topic_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    message_ids TEXT NOT NULL,
+    media_key TEXT,
+    album INTEGER NOT NULL DEFAULT 0,
+    coalesced INTEGER NOT NULL DEFAULT 0,
+    webhook INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (origem_id, topic_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS messages_created_at ON messages (origem_id, created_at);
+CREATE TABLE IF NOT EXISTS webhooks (
+    channel_id INTEGER PRIMARY KEY,
+    webhook_id INTEGER NOT NULL,
+    token TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS media_cache (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    filename TEXT,
+    size INTEGER,
+    image INTEGER NOT NULL DEFAULT 0,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS media_cache_used_at ON media_cache (used_at);
+CREATE TABLE IF NOT EXISTS outbox (
+    origem_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    message_ids TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_at REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    sent TEXT,
+    PRIMARY KEY (origem_id, key)
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+# persistence layer shared by the whole bridge
+class MappingStore(ABC):
+    @abstractmethod
+    async def open(self):
+        ...
+
+    @abstractmethod
+    async def close(self):
+        ...
+
+    @abstractmethod
+    async def flush(self):
+        ...
+
+    @abstractmethod
+    async def load_topic_mappings(self, origem_id):
+        ...
+
+    @abstractmethod
+    def put_topic_mapping(self, origem_id, topic_id, channel_id):
+        ...
+
+    @abstractmethod
+    async def load_messages(self, origem_id):
+        ...
+
+    @abstractmethod
+    def put_message(self, origem_id, topic_id, message_id, entry):
+        ...
+
+    @abstractmethod
+    def delete_message(self, origem_id, topic_id, message_id):
+        ...
+
+    @abstractmethod
+    async def load_webhooks(self):
+        ...
+
+    @abstractmethod
+    def put_webhook(self, channel_id, webhook_id, token):
+        ...
+
+    @abstractmethod
+    def delete_webhook(self, channel_id):
+        ...
+
+    @abstractmethod
+    async def load_media_cache(self, limit):
+        ...
+
+    @abstractmethod
+    def put_media_cache(self, key, entry):
+        ...
+
+    @abstractmethod
+    def delete_media_cache(self, key):
+        ...
+
+    @abstractmethod
+    async def load_outbox(self, origem_id):
+        ...
+
+    @abstractmethod
+    def put_outbox(self, origem_id, key, entry):
+        ...
+
+    @abstractmethod
+    def delete_outbox(self, origem_id, key):
+        ...
+
+    @abstractmethod
+    async def get_state(self, key, default=None):
+        ...
+
+    @abstractmethod
+    def put_state(self, key, value):
+        ...
+
+
+# backoff of a batch that failed to commit, in seconds
+WRITE_RETRY_BASE = 0.5
+WRITE_RETRY_MAX = 30
+
+# commits tried on shutdown before the pending writes are given up
+CLOSE_FLUSH_ATTEMPTS = 3
+
+
+# sqlite in WAL mode; every write goes through one batched transaction off the event loop
+class SQLiteStore(MappingStore):
+    def __init__(self, path, batch_interval=0.05):
+        self.path = path
+        self.batch_interval = batch_interval
+
+        # a single thread owns the connection, so sqlite calls never run concurrently
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store")
+        self._conn = None
+
+        # pending writes: [(sql, params)]
+        self._ops = []
+        self._wakeup = asyncio.Event()
+        self._commit_lock = asyncio.Lock()
+        self._writer_task = None
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    async def open(self):
+        self._conn = await self._run(self._connect)
+        self._writer_task = asyncio.create_task(self._writer())
+        logger.info(f"Banco de mapeamentos aberto: {self.path}")
+
+    async def close(self):
+        if self._writer_task:
+            self._writer_task.cancel()
+        for attempt in range(CLOSE_FLUSH_ATTEMPTS):
+            try:
+                await self.flush()
+                break
+            except Exception as e:
+                logger.error(f"Erro ao gravar alterações pendentes no banco de mapeamentos: {e}")
+                await asyncio.sleep(WRITE_RETRY_BASE * 2 ** attempt)
+        if self._conn:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+    def _apply(self, ops):
+        # one transaction for the whole batch: either every write lands or none
+        with self._conn:
+            for sql, params in ops:
+                self._conn.execute(sql, params)
+
+    async def _commit(self):
+        async with self._commit_lock:
+            if not self._ops:
+                return
+
+            ops, self._ops = self._ops, []
+            try:
+                await self._run(self._apply, ops)
+            except Exception:
+                # the transaction rolled back: the batch goes back ahead of newer writes, in order
+                self._ops[:0] = ops
+                raise
+
+    async def _writer(self):
+        delay = 0
+        while True:
+            await self._wakeup.wait()
+
+            # let writes from the same burst join the batch
+            await asyncio.sleep(self.batch_interval)
+            self._wakeup.clear()
+            try:
+                await self._commit()
+                delay = 0
+            except Exception as e:
+                # e.g. SQLITE_BUSY while another shard holds the lock; retried until it lands
+                delay = min(max(delay * 2, self.batch_interval, WRITE_RETRY_BASE), WRITE_RETRY_MAX)
+                logger.error(f"Erro ao gravar alterações no banco de mapeamentos, tentando de novo em {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                self._wakeup.set()
+
+    def _write(self, sql, params):
+        self._ops.append((sql, params))
+        self._wakeup.set()
+
+    async def flush(self):
+        await self._commit()
+
+    def _query(self, sql, params):
+        return self._conn.execute(sql, params).fetchall()
+
+    async def load_topic_mappings(self, origem_id):
+        rows = await self._run(self._query, "SELECT topic_id, channel_id FROM topic_mappings WHERE origem_id = ?", (str(origem_id),))
+        return {topic_id: channel_id for topic_id, channel_id in rows}
+
+    def put_topic_mapping(self, origem_id, topic_id, channel_id):
+        self._write(
+            "INSERT OR REPLACE INTO topic_mappings (origem_id, topic_id, channel_id) VALUES (?, ?, ?)",
+            (str(origem_id), topic_id, channel_id)
+        )
+
+    async def load_messages(self, origem_id):
+        rows = await self._run(
+            self._query,
+            "SELECT topic_id, message_id, channel_id, message_ids, media_key, album, coalesced, webhook, created_at FROM messages "
+            "WHERE origem_id = ? ORDER BY created_at",
+            (str(origem_id),)
+        )
+        return [
+            (topic_id, message_id, {
+                "channel_id": channel_id,
+                "message_ids": json.loads(message_ids),
+                "media_key": media_key,
+                "album": bool(album),
+                "coalesced": bool(coalesced),
+                "webhook": bool(webhook),
+                "created_at": created_at,
+            })
+            for topic_id, message_id, channel_id, message_ids, media_key, album, coalesced, webhook, created_at in rows
+        ]
+
+    def put_message(self, origem_id, topic_id, message_id, entry):
+        self._write(
+            "INSERT OR REPLACE INTO messages (origem_id, topic_id, message_id, channel_id, message_ids, media_key, album, coalesced, webhook, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(origem_id), topic_id, message_id, entry["channel_id"], json.dumps(entry["message_ids"]),
+             entry["media_key"], int(entry["album"]), int(entry.get("coalesced", False)), int(entry.get("webhook", False)),
+             entry["created_at"])
+        )
+
+    def delete_message(self, origem_id, topic_id, message_id):
+        self._write(
+            "DELETE FROM messages WHERE origem_id = ? AND topic_id = ? AND message_id = ?",
+            (str(origem_id), topic_id, message_id)
+        )
+
+    async def load_webhooks(self):
+        rows = await self._run(self._query, "SELECT channel_id, webhook_id, token FROM webhooks", ())
+        return {channel_id: (webhook_id, token) for channel_id, webhook_id, token in rows}
+
+    def put_webhook(self, channel_id, webhook_id, token):
+        self._write(
+            "INSERT OR REPLACE INTO webhooks (channel_id, webhook_id, token) VALUES (?, ?, ?)",
+            (channel_id, webhook_id, token)
+        )
+
+    def delete_webhook(self, channel_id):
+        self._write("DELETE FROM webhooks WHERE channel_id = ?", (channel_id,))
+
+    async def load_media_cache(self, limit):
+        # the most recently used entries, returned oldest first so they load in lru order
+        rows = await self._run(
+            self._query,
+            "SELECT key, url, filename, size, image, used_at FROM "
+            "(SELECT * FROM media_cache ORDER BY used_at DESC LIMIT ?) ORDER BY used_at",
+            (limit,)
+        )
+
+        # whatever didn't fit (e.g. after lowering the limit) is dropped
+        self._write("DELETE FROM media_cache WHERE key NOT IN (SELECT key FROM media_cache ORDER BY used_at DESC LIMIT ?)", (limit,))
+        return [
+            (key, {"url": url, "filename": filename, "size": size, "image": bool(image), "used_at": used_at})
+            for key, url, filename, size, image, used_at in rows
+        ]
+
+    def put_media_cache(self, key, entry):
+        self._write(
+            "INSERT OR REPLACE INTO media_cache (key, url, filename, size, image, used_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, entry["url"], entry["filename"], entry["size"], int(entry["image"]), entry["used_at"])
+        )
+
+    def delete_media_cache(self, key):
+        self._write("DELETE FROM media_cache WHERE key = ?", (key,))
+
+    async def load_outbox(self, origem_id):
+        rows = await self._run(
+            self._query,
+            "SELECT key, kind, message_ids, attempts, next_at, created_at, sent FROM outbox WHERE origem_id = ? ORDER BY created_at",
+            (str(origem_id),)
+        )
+        return {
+            key: {
+                "kind": kind,
+                "message_ids": json.loads(message_ids),
+                "attempts": attempts,
+                "next_at": next_at,
+                "created_at": created_at,
+                "sent": json.loads(sent) if sent else None,
+            }
+            for key, kind, message_ids, attempts, next_at, created_at, sent in rows
+        }
+
+    def put_outbox(self, origem_id, key, entry):
+        sent = entry.get("sent")
+        self._write(
+            "INSERT OR REPLACE INTO outbox (origem_id, key, kind, message_ids, attempts, next_at, created_at, sent) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(origem_id), key, entry["kind"], json.dumps(entry["message_ids"]), entry["attempts"], entry["next_at"], entry["created_at"],
+             json.dumps(sent) if sent else None)
+        )
+
+    def delete_outbox(self, origem_id, key):
+        self._write("DELETE FROM outbox WHERE origem_id = ? AND key = ?", (str(origem_id), key))
+
+    async def get_state(self, key, default=None):
+        rows = await self._run(self._query, "SELECT value FROM state WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else default
+
+    def put_state(self, key, value):
+        self._write("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+
+def open_store(backend, path):
+    if backend == "sqlite":
+        return SQLiteStore(path)
+    raise ValueError(f"Backend de armazenamento desconhecido: {backend}")
+
+
+async def migrate_json_files(store, mappings_dir):
+    """
+    Importa os arquivos JSON antigos de mapeamento de tópicos para o banco e renomeia cada
+    arquivo para .migrated
+    """
+    for path in glob.glob(os.path.join(mappings_dir, "topic_mapping_*_discord.json")):
+        origem_id = os.path.basename(path)[len("topic_mapping_"):-len("_discord.json")]
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            for topic_id, channel_id in data.items():
+                store.put_topic_mapping(origem_id, int(topic_id), int(channel_id))
+            await store.flush()
+            os.replace(path, f"{path}.migrated")
+            logger.info(f"Mapeamento JSON migrado para o banco: {path} ({len(data)} tópicos)")
+        except Exception as e:
+            logger.error(f"Erro ao migrar mapeamento {path}: {e}")
@@ -0,0 +1,24 @@
+import asyncio
+
+from text import Coalescer
+
+
+def test_coalescer_keeps_buffer_opened_during_a_slow_flush():
+    async def scenario():
+        delivered = []
+
+        async def on_flush(channel_id, items, author):
+            # a full send queue makes the flush wait before the delivery is queued
+            await asyncio.sleep(0.01)
+            delivered.extend(item for item, _ in items)
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(None)
+            return future
+
+        coalescer = Coalescer(0.05, on_flush, limit=3)
+        first = await coalescer.add(1, "a", "aa")
+        second, third = await asyncio.gather(coalescer.add(1, "b", "bb"), coalescer.add(1, "c", "c"))
+        await asyncio.wait_for(asyncio.gather(first, second, third), 1)
+        return delivered
+
+    assert sorted(asyncio.run(scenario())) == ["a", "b", "c"]
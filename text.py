@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# discord's message length limit
+MAX_MESSAGE_LENGTH = 2000
+
+CONTINUATION = "(Continuação) "
+
+# the language tag is capped, so reopening a block never eats the chunk budget
+FENCE = re.compile(r"```(\w{0,20})")
+
+URL = re.compile(r"\w+://\S+")
+
+# preferred cut points, best first; the int is how many chars of the separator stay in the chunk
+SEPARATORS = [("\n\n", 0), ("\n", 0), (". ", 1), ("! ", 1), ("? ", 1), (" ", 0)]
+
+
+def _find_cut(text, budget):
+    window = text[:budget]
+    for separator, keep in SEPARATORS:
+        index = window.rfind(separator)
+
+        # don't accept cuts that leave a tiny chunk behind
+        if index > budget // 2:
+            return index + keep, len(separator) - keep
+
+    # a hard cut never goes through a url, even if that leaves a short chunk; only a url
+    # longer than the whole chunk is cut
+    for match in URL.finditer(text, 0, len(text)):
+        if match.start() >= budget:
+            break
+        if match.start() > 0 and match.end() > budget:
+            return match.start(), 0
+    return budget, 0
+
+
+def _open_fence(text, fence):
+    # toggles on every ``` marker, remembering the language of the last opened block
+    for match in FENCE.finditer(text):
+        fence = None if fence else match.group(0)
+    return fence
+
+
+def split_message(text, limit=MAX_MESSAGE_LENGTH):
+    """
+    Divide o texto em partes de até limit caracteres, cortando em parágrafos, linhas, frases ou
+    palavras. Blocos de código abertos são fechados e reabertos entre as partes.
+    """
+    if len(text) <= limit:
+        return [text]
+
+    chunks = []
+    fence = None
+    rest = text
+
+    while rest:
+        prefix = CONTINUATION if chunks else ""
+        reopen = f"{fence}\n" if fence else ""
+        close = "\n```"
+
+        # keep room to close a code block that stays open
+        budget = limit - len(prefix) - len(reopen) - len(close)
+        if budget <= 0:
+            # a limit too small for the fences (or even the prefix) splits the plain text
+            reopen = close = ""
+            budget = max(1, limit - len(prefix))
+
+        if len(rest) <= budget:
+            piece, rest = rest, ""
+        else:
+            cut, skip = _find_cut(rest, budget)
+            piece, rest = rest[:cut], rest[cut + skip:]
+
+        fence = _open_fence(piece, fence)
+        chunk = f"{prefix}{reopen}{piece}"
+        if fence and rest:
+            chunk += close
+        chunks.append(chunk)
+
+    return chunks
+
+
+# merges consecutive short messages for the same channel into one discord message
+class Coalescer:
+    def __init__(self, window, on_flush, limit=MAX_MESSAGE_LENGTH):
+        self.window = window
+        self.limit = limit
+
+        # called with (channel_id, [(item, text)], author), returns a future for the delivery
+        self.on_flush = on_flush
+
+        # buffers: {channel_id: {"items": [(item, text, future)], "size": int, "author": author, "timer": task}}
+        self._buffers = {}
+
+    def fits(self, text):
+        return len(text) <= self.limit
+
+    async def add(self, channel_id, item, text, author=None):
+        """
+        Acumula o texto para o canal; devolve um future resolvido quando o envio agrupado terminar.
+        Textos de autores diferentes (envio por webhook) nunca são agrupados.
+        """
+        # the flush may wait on a full send queue while another add opens a new buffer, so look again after it
+        buffer = self._buffers.get(channel_id)
+
+        # +1 for the newline that joins the texts
+        while buffer and (buffer["size"] + 1 + len(text) > self.limit or buffer["author"] != author):
+            await self.flush(channel_id)
+            buffer = self._buffers.get(channel_id)
+
+        if not buffer:
+            buffer = {"items": [], "size": -1, "author": author, "timer": None}
+            self._buffers[channel_id] = buffer
+            buffer["timer"] = asyncio.create_task(self._flush_later(channel_id, buffer))
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        buffer["items"].append((item, text, future))
+        buffer["size"] += 1 + len(text)
+        return future
+
+    async def _flush_later(self, channel_id, buffer):
+        await asyncio.sleep(self.window)
+        if self._buffers.get(channel_id) is buffer:
+            await self.flush(channel_id, from_timer=True)
+
+    async def flush(self, channel_id, from_timer=False):
+        buffer = self._buffers.pop(channel_id, None)
+        if not buffer:
+            return
+
+        if not from_timer:
+            buffer["timer"].cancel()
+
+        items = buffer["items"]
+        try:
+            delivery = await self.on_flush(channel_id, [(item, text) for item, text, _ in items], buffer["author"])
+        except Exception as e:
+            logger.error(f"Erro ao enviar mensagens agrupadas do canal {channel_id}: {e}")
+            delivery = None
+
+        def resolve(f):
+            for _, _, future in items:
+                if future.done():
+                    continue
+                if f is None or f.cancelled():
+                    future.cancel()
+                elif f.exception():
+                    future.set_exception(f.exception())
+                else:
+                    future.set_result(f.result())
+
+        if delivery is None:
+            resolve(None)
+        else:
+            delivery.add_done_callback(resolve)
+
+    async def flush_all(self):
+        for channel_id in list(self._buffers):
+            await self.flush(channel_id)
@@ -0,0 +1,174 @@
+from telethon import functions, types
+from telethon.errors import FloodWaitError
+from collections import OrderedDict
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# max topics per GetForumTopicsRequest page accepted by telegram
+TOPICS_PAGE_SIZE = 100
+
+# how long a fallback title ("Tópico <id>") is kept before trying again
+FALLBACK_TTL = 60
+
+
+# in-memory registry of forum topic titles
+class TopicRegistry:
+    def __init__(self, client, channel_entity, ttl=3600, max_size=5000):
+        self.client = client
+        self.channel_entity = channel_entity
+        self.ttl = ttl
+        self.max_size = max_size
+
+        # cache of titles: {topic_id: (title, expires_at)}
+        self._titles = OrderedDict()
+
+        # lookups in flight, so concurrent misses share one request
+        self._pending = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self, topic_id, title, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._titles[topic_id] = (title, expires_at)
+        self._titles.move_to_end(topic_id)
+
+        # evict least recently used topics
+        while len(self._titles) > self.max_size:
+            self._titles.popitem(last=False)
+
+    def _lookup(self, topic_id):
+        entry = self._titles.get(topic_id)
+        if not entry:
+            return None
+
+        title, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._titles[topic_id]
+            return None
+
+        self._titles.move_to_end(topic_id)
+        return title
+
+    async def load_all(self):
+        """
+        Carrega todos os tópicos do fórum, paginando GetForumTopicsRequest além de 100 tópicos
+        """
+        offset_date = None
+        offset_id = 0
+        offset_topic = 0
+        loaded = 0
+
+        while True:
+            try:
+                result = await self.client(functions.channels.GetForumTopicsRequest(
+                    channel=self.channel_entity,
+                    offset_date=offset_date,
+                    offset_id=offset_id,
+                    offset_topic=offset_topic,
+                    limit=TOPICS_PAGE_SIZE,
+                    q=""
+                ))
+            except FloodWaitError as e:
+                logger.warning(f"FloodWait ao carregar tópicos, aguardando {e.seconds}s")
+                await asyncio.sleep(e.seconds)
+                continue
+            except Exception as e:
+                logger.error(f"Erro ao carregar tópicos do fórum: {e}")
+                break
+
+            topics = [t for t in result.topics if isinstance(t, types.ForumTopic)]
+            for topic in topics:
+                self._store(topic.id, topic.title)
+            loaded += len(topics)
+
+            if len(result.topics) < TOPICS_PAGE_SIZE or not topics:
+                break
+
+            # next page starts after the last topic of this one
+            last = topics[-1]
+            messages = {m.id: m for m in result.messages}
+            top_message = messages.get(last.top_message)
+            offset_date = getattr(top_message, 'date', None)
+            offset_id = last.top_message
+            offset_topic = last.id
+
+        logger.info(f"Tópicos do fórum carregados: {loaded}")
+        return loaded
+
+    async def _fetch_title(self, topic_id):
+        try:
+            result = await self.client(functions.channels.GetForumTopicsByIDRequest(
+                channel=self.channel_entity,
+                topics=[topic_id]
+            ))
+            for topic in result.topics:
+                if isinstance(topic, types.ForumTopic) and topic.id == topic_id:
+                    self._store(topic_id, topic.title)
+                    return topic.title
+        except Exception as e:
+            logger.warning(f"Não foi possível obter título do tópico {topic_id}: {e}")
+
+        title = f"Tópico {topic_id}"
+        self._store(topic_id, title, ttl=min(self.ttl, FALLBACK_TTL))
+        return title
+
+    async def get_title(self, topic_id):
+        """
+        Retorna o título do tópico, consultando o Telegram apenas em caso de falta no cache
+        """
+        title = self._lookup(topic_id)
+        if title is not None:
+            self.hits += 1
+            return title
+
+        self.misses += 1
+
+        task = self._pending.get(topic_id)
+        if not task:
+            task = asyncio.ensure_future(self._fetch_title(topic_id))
+            self._pending[topic_id] = task
+            task.add_done_callback(lambda _: self._pending.pop(topic_id, None))
+
+        # one waiter being cancelled doesn't cancel the lookup the others share
+        return await asyncio.shield(task)
+
+    def invalidate(self, topic_id=None):
+        if topic_id is None:
+            self._titles.clear()
+        else:
+            self._titles.pop(topic_id, None)
+
+    def handle_service_message(self, message):
+        """
+        Atualiza o cache a partir de mensagens de serviço de criação/edição de tópico
+        """
+        action = getattr(message, 'action', None)
+
+        if isinstance(action, types.MessageActionTopicCreate):
+            self._store(message.id, action.title)
+            logger.info(f"Tópico criado: {action.title} (ID: {message.id})")
+            return True
+
+        if isinstance(action, types.MessageActionTopicEdit):
+            reply_to = getattr(message, 'reply_to', None)
+            topic_id = getattr(reply_to, 'reply_to_top_id', None) or getattr(reply_to, 'reply_to_msg_id', None)
+            if not topic_id:
+                return False
+
+            if action.title:
+                self._store(topic_id, action.title)
+                logger.info(f"Tópico renomeado: {action.title} (ID: {topic_id})")
+            return True
+
+        return False
+
+    def stats(self):
+        return {
+            "size": len(self._titles),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,207 @@
+from collections import OrderedDict
+import asyncio
+import logging
+import time
+import re
+import io
+import discord
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_NAME = "Telegram Bridge"
+
+# discord rejects webhook usernames longer than this or containing these words
+MAX_USERNAME_LENGTH = 80
+FORBIDDEN_USERNAME = re.compile(r"discord|clyde", re.IGNORECASE)
+
+# how long a failed avatar lookup is kept before trying again
+AVATAR_FALLBACK_TTL = 60
+
+# discord's error code for a webhook that no longer exists
+UNKNOWN_WEBHOOK = 10015
+
+
+# the channel's webhook was deleted and no new one could be created; retried later, through the bot
+class WebhookGone(Exception):
+    def __init__(self, channel_id):
+        super().__init__(f"webhook do canal {channel_id} não existe mais")
+        self.channel_id = channel_id
+
+
+def webhook_username(name):
+    # a zero-width space breaks the forbidden words without changing how the name looks
+    name = FORBIDDEN_USERNAME.sub(lambda m: m.group(0)[0] + "\u200b" + m.group(0)[1:], name or "").strip()
+    return name[:MAX_USERNAME_LENGTH] or "Telegram"
+
+
+# who a message is posted as when it goes through a channel webhook
+class WebhookAuthor:
+    def __init__(self, webhook, username, avatar_url=None):
+        self.webhook = webhook
+        self.username = username
+        self.avatar_url = avatar_url
+
+    def __eq__(self, other):
+        return isinstance(other, WebhookAuthor) and (self.webhook.id, self.username, self.avatar_url) == (other.webhook.id, other.username, other.avatar_url)
+
+    async def send(self, content=None, **kwargs):
+        kwargs = {k: v for k, v in kwargs.items() if v is not None}
+        return await self.webhook.send(
+            content=content,
+            username=self.username,
+            avatar_url=self.avatar_url or discord.utils.MISSING,
+            wait=True,
+            **kwargs
+        )
+
+
+# telegram profile photos re-hosted on discord, so webhooks can use them as avatars
+class AvatarCache:
+    def __init__(self, telegram_client, discord_client, channel_id, ttl=43200, max_size=2000):
+        self.telegram_client = telegram_client
+        self.discord_client = discord_client
+        self.channel_id = channel_id
+        self.ttl = ttl
+        self.max_size = max_size
+
+        # cache of urls: {(sender_id, photo_id): (url, expires_at)}
+        self._urls = OrderedDict()
+
+        # uploads in flight, so concurrent misses share one upload
+        self._pending = {}
+
+    async def _upload(self, sender):
+        data = await self.telegram_client.download_profile_photo(sender, file=bytes, download_big=False)
+        if not data:
+            return None
+
+        channel = self.discord_client.get_channel(self.channel_id)
+        if not channel:
+            logger.error(f"Canal de avatares não encontrado: {self.channel_id}")
+            return None
+
+        sent = await channel.send(file=discord.File(io.BytesIO(data), filename=f"{sender.id}.jpg"))
+        return sent.attachments[0].url
+
+    async def get_url(self, sender):
+        """
+        Retorna a URL do avatar do remetente, enviando a foto ao canal de avatares apenas uma vez
+        """
+        photo = getattr(sender, 'photo', None)
+        photo_id = getattr(photo, 'photo_id', None)
+        if not self.channel_id or not photo_id:
+            return None
+
+        key = (sender.id, photo_id)
+        entry = self._urls.get(key)
+        if entry and entry[1] > time.monotonic():
+            self._urls.move_to_end(key)
+            return entry[0]
+
+        task = self._pending.get(key)
+        if not task:
+            task = asyncio.ensure_future(self._upload(sender))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+        ttl = self.ttl
+        try:
+            url = await asyncio.shield(task)
+        except Exception as e:
+            logger.warning(f"Não foi possível obter avatar de {sender.id}: {e}")
+            url = None
+            ttl = min(self.ttl, AVATAR_FALLBACK_TTL)
+
+        # attachment urls expire, so the upload is refreshed after ttl
+        self._urls[key] = (url, time.monotonic() + ttl)
+        while len(self._urls) > self.max_size:
+            self._urls.popitem(last=False)
+        return url
+
+
+# one webhook per discord channel, created on first use and persisted in the store
+class WebhookRegistry:
+    def __init__(self, discord_client, store, avatars=None):
+        self.discord_client = discord_client
+        self.store = store
+        self.avatars = avatars
+
+        # webhooks: {channel_id: discord.Webhook, or None when the bot can't manage webhooks there}
+        self._webhooks = {}
+
+        # persisted webhooks, turned into discord.Webhook once the client has a session: {channel_id: (id, token)}
+        self._saved = {}
+
+        # lookups in flight: {channel_id: task}
+        self._pending = {}
+
+    def _partial(self, webhook_id, token):
+        return discord.Webhook.partial(webhook_id, token, client=self.discord_client)
+
+    async def load(self):
+        try:
+            self._saved = await self.store.load_webhooks()
+            logger.info(f"Webhooks carregados: {len(self._saved)} canais")
+        except Exception as e:
+            logger.error(f"Erro ao carregar webhooks: {e}")
+
+    async def _create(self, channel):
+        try:
+            # reuse a webhook left by a previous run whose row was lost
+            bot_id = self.discord_client.user.id if self.discord_client.user else None
+            for webhook in await channel.webhooks():
+                if webhook.token and webhook.user and webhook.user.id == bot_id and webhook.name == WEBHOOK_NAME:
+                    break
+            else:
+                webhook = await channel.create_webhook(name=WEBHOOK_NAME)
+                logger.info(f"Webhook criado no canal Discord: {channel.name}")
+        except discord.errors.Forbidden:
+            logger.warning(f"Sem permissão para gerenciar webhooks em {channel.name}, enviando pelo bot")
+            return None
+
+        self.store.put_webhook(channel.id, webhook.id, webhook.token)
+        return self._partial(webhook.id, webhook.token)
+
+    async def get(self, channel):
+        """
+        Retorna o webhook do canal, criando-o se necessário; None se o canal deve usar o bot
+        """
+        if channel.id in self._webhooks:
+            return self._webhooks[channel.id]
+
+        saved = self._saved.pop(channel.id, None)
+        if saved:
+            self._webhooks[channel.id] = self._partial(*saved)
+            return self._webhooks[channel.id]
+
+        task = self._pending.get(channel.id)
+        if not task:
+            task = asyncio.ensure_future(self._create(channel))
+            self._pending[channel.id] = task
+            task.add_done_callback(lambda _: self._pending.pop(channel.id, None))
+
+        try:
+            webhook = await asyncio.shield(task)
+        except Exception as e:
+            logger.error(f"Erro ao obter webhook do canal {channel.name}: {e}")
+            return None
+
+        self._webhooks[channel.id] = webhook
+        return webhook
+
+    def invalidate(self, channel_id, webhook_id=None):
+        # the webhook was deleted on discord, a new one is created on the next message;
+        # one that already replaced it (another send hit the same error first) is kept
+        current = self._webhooks.get(channel_id)
+        if webhook_id and current and current.id != webhook_id:
+            return
+        self._saved.pop(channel_id, None)
+        if self._webhooks.pop(channel_id, None):
+            self.store.delete_webhook(channel_id)
+            logger.warning(f"Webhook do canal {channel_id} não existe mais")
+
+    async def author(self, webhook, message, sender_name):
+        avatar_url = None
+        if self.avatars:
+            avatar_url = await self.avatars.get_url(await message.get_sender())
+        return WebhookAuthor(webhook, webhook_username(sender_name), avatar_url)